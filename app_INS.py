@@ -1,27 +1,16 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split, GridSearchCV, StratifiedKFold
-from sklearn.metrics import accuracy_score, classification_report
-from sklearn.preprocessing import LabelEncoder, OneHotEncoder
-from sklearn.pipeline import Pipeline
-from imblearn.over_sampling import SMOTE
-from imblearn.pipeline import Pipeline as ImbPipeline
-import plotly.graph_objects as go
-import re
-from collections import Counter
+from sklearn.preprocessing import LabelEncoder
+from collections import OrderedDict
+import copy
+import threading
 import os
-import pickle
-import hashlib
 from datetime import datetime
 import base64
-import time
-from io import BytesIO
-from openpyxl.styles import PatternFill
-from openpyxl.utils import get_column_letter
+from batch_utils import BatchTextReader
+from predictor_core import EnhancedHierarchicalPredictor
+from training_jobs import ACTIVE_STATES, TrainingJobRunner
+from export_utils import StreamingExportWriter, is_confidence_column
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -71,31 +60,33 @@ def set_background_image(image_file):
 
 
 
-# Configuration de la page
-st.set_page_config(
-    page_title="Classifieur de l’activité selon la nomenclature",
-    page_icon="🔍",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+def configure_page():
+    """Configuration de la page, image de fond et logos d'en-tête"""
+    # Configuration de la page
+    st.set_page_config(
+        page_title="Classifieur de l’activité selon la nomenclature",
+        page_icon="🔍",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
 
-# Définir l'image de fond
-image_path = os.path.join("images", "Structure.jpg")
-#image_path = os.path.abspath(os.path.join("images", "Structure.jpg"))
-if os.path.exists(image_path):
-    set_background_image(image_path)
+    # Définir l'image de fond
+    image_path = os.path.join("images", "Structure.jpg")
+    #image_path = os.path.abspath(os.path.join("images", "Structure.jpg"))
+    if os.path.exists(image_path):
+        set_background_image(image_path)
 
-# Afficher les logos
-col1, col2, col3 = st.columns([1, 4, 1])
-with col1:
-    logo1_path = os.path.join("images", "logo1.jpg")
-    if os.path.exists(logo1_path):
-        st.image(logo1_path, use_column_width=True)
+    # Afficher les logos
+    col1, col2, col3 = st.columns([1, 4, 1])
+    with col1:
+        logo1_path = os.path.join("images", "logo1.jpg")
+        if os.path.exists(logo1_path):
+            st.image(logo1_path, use_column_width=True)
 
-with col3:
-    logo2_path = os.path.join("images", "logo2.jpg")
-    if os.path.exists(logo2_path):
-        st.image(logo2_path, use_column_width=True)
+    with col3:
+        logo2_path = os.path.join("images", "logo2.jpg")
+        if os.path.exists(logo2_path):
+            st.image(logo2_path, use_column_width=True)
 
 
 def display_fixed_logos():
@@ -187,83 +178,85 @@ def display_fixed_logos():
     
     # Message de confirmation dans la sidebar
 
-# Déplacer de manière transitoire l'arrière plan
-st.markdown("""
-<style>
-/* Décalage du contenu principal */
-[data-testid="stSidebar"][aria-expanded="true"] ~ div[data-testid="stAppViewContainer"] {
-    margin-left: 250px;
-    transition: margin-left 0.3s ease;
-}
-[data-testid="stSidebar"][aria-expanded="false"] ~ div[data-testid="stAppViewContainer"] {
-    margin-left: 0;
-    transition: margin-left 0.3s ease;
-}
-
-/* ✅ Correction : déplacement direct du logo gauche */
-.fixed-logo-left {
-    position: fixed !important;
-    top: 80px !important;
-    left: 20px !important;
-    transition: left 0.3s ease !important;
-    z-index: 9999 !important;
-}
-
-/* Quand la sidebar est ouverte (hack via parent [aria-expanded]) */
-section[data-testid="stSidebar"][aria-expanded="true"] ~ div [class="fixed-logo-left"] {
-    left: 270px !important; /* 250px + marge */
-}
-
-section[data-testid="stSidebar"][aria-expanded="true"] ~ div [class="fixed-logo-left"] {
-    left: 270px !important;
-    opacity: 0.85;
-    transition: left 0.3s ease, opacity 0.3s ease;
-}
-
-</style>
-""", unsafe_allow_html=True)
-
-# Barre supérieure
-st.markdown("""
-<style>
-header[data-testid="stHeader"] {
-    background-color: #567671 !important;
-}
-</style>
-""", unsafe_allow_html=True)
-
-# Barre de défilement
-st.markdown("""
-<style>
-/* --- Sidebar Scrollbar --- */
-section[data-testid="stSidebar"]::-webkit-scrollbar {
-    width: 40px;
-}
-section[data-testid="stSidebar"]::-webkit-scrollbar-track {
-    background: #08C478;
-    border-radius: 40px;
-}
-section[data-testid="stSidebar"]::-webkit-scrollbar-thumb {
-    background: linear-gradient(180deg, #4B0082, #8A2BE2);
-    border-radius: 40px;
-}
-section[data-testid="stSidebar"]::-webkit-scrollbar-thumb:hover {
-    background: linear-gradient(180deg, #5E11A3, #A15CF2);
-}
-
-/* --- Contenu principal Scrollbar --- */
-div[data-testid="stAppViewContainer"]::-webkit-scrollbar {
-    width: 40px;
-}
-div[data-testid="stAppViewContainer"]::-webkit-scrollbar-thumb {
-    background-color: #444;
-    border-radius: 40px;
-}
-div[data-testid="stAppViewContainer"]::-webkit-scrollbar-thumb:hover {
-    background-color: #777;
-}
-</style>
-""", unsafe_allow_html=True)
+def load_layout_css():
+    """Styles de mise en page : contenu principal, barre supérieure, barres de défilement"""
+    # Déplacer de manière transitoire l'arrière plan
+    st.markdown("""
+    <style>
+    /* Décalage du contenu principal */
+    [data-testid="stSidebar"][aria-expanded="true"] ~ div[data-testid="stAppViewContainer"] {
+        margin-left: 250px;
+        transition: margin-left 0.3s ease;
+    }
+    [data-testid="stSidebar"][aria-expanded="false"] ~ div[data-testid="stAppViewContainer"] {
+        margin-left: 0;
+        transition: margin-left 0.3s ease;
+    }
+
+    /* ✅ Correction : déplacement direct du logo gauche */
+    .fixed-logo-left {
+        position: fixed !important;
+        top: 80px !important;
+        left: 20px !important;
+        transition: left 0.3s ease !important;
+        z-index: 9999 !important;
+    }
+
+    /* Quand la sidebar est ouverte (hack via parent [aria-expanded]) */
+    section[data-testid="stSidebar"][aria-expanded="true"] ~ div [class="fixed-logo-left"] {
+        left: 270px !important; /* 250px + marge */
+    }
+
+    section[data-testid="stSidebar"][aria-expanded="true"] ~ div [class="fixed-logo-left"] {
+        left: 270px !important;
+        opacity: 0.85;
+        transition: left 0.3s ease, opacity 0.3s ease;
+    }
+
+    </style>
+    """, unsafe_allow_html=True)
+
+    # Barre supérieure
+    st.markdown("""
+    <style>
+    header[data-testid="stHeader"] {
+        background-color: #567671 !important;
+    }
+    </style>
+    """, unsafe_allow_html=True)
+
+    # Barre de défilement
+    st.markdown("""
+    <style>
+    /* --- Sidebar Scrollbar --- */
+    section[data-testid="stSidebar"]::-webkit-scrollbar {
+        width: 40px;
+    }
+    section[data-testid="stSidebar"]::-webkit-scrollbar-track {
+        background: #08C478;
+        border-radius: 40px;
+    }
+    section[data-testid="stSidebar"]::-webkit-scrollbar-thumb {
+        background: linear-gradient(180deg, #4B0082, #8A2BE2);
+        border-radius: 40px;
+    }
+    section[data-testid="stSidebar"]::-webkit-scrollbar-thumb:hover {
+        background: linear-gradient(180deg, #5E11A3, #A15CF2);
+    }
+
+    /* --- Contenu principal Scrollbar --- */
+    div[data-testid="stAppViewContainer"]::-webkit-scrollbar {
+        width: 40px;
+    }
+    div[data-testid="stAppViewContainer"]::-webkit-scrollbar-thumb {
+        background-color: #444;
+        border-radius: 40px;
+    }
+    div[data-testid="stAppViewContainer"]::-webkit-scrollbar-thumb:hover {
+        background-color: #777;
+    }
+    </style>
+    """, unsafe_allow_html=True)
 
 
 def load_css():
@@ -742,324 +735,67 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
-st.markdown("""
-    <style>
-    /* ✅ Boîte de texte plus lisible */
-    textarea, .stTextArea textarea {
-        background-color: #ffffff !important;
-        color: #000000 !important;
-        font-size: 16px !important;
-    }
-
-    /* ✅ Boutons mieux visibles */
-    .stButton>button {
-        background-color: #6c63ff !important;
-        color: white !important;
-        border-radius: 10px !important;
-        font-weight: bold;
-    }
-    </style>
-""", unsafe_allow_html=True)
-
-class EnhancedHierarchicalPredictor:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            max_features=10000,
-            ngram_range=(1, 3),
-            lowercase=True,
-            analyzer='word',
-            min_df=1,
-            max_df=0.95
-        )
-        
-        # Modèle unique pour CPU - MultinomialNB seulement
-        self.base_models = {
-            'Naive Bayes': MultinomialNB()#,
-#            'Logistic Regression': LogisticRegression(max_iter=1000, solver='lbfgs', multi_class='auto')
-        }
-        
-        # Grille de paramètres simplifiée
-        self.param_grids = {
-            'Naive Bayes': {'alpha': [0.1, 0.5, 1.0]}#,
-#                 'Logistic Regression': {'C': [0.1, 1.0, 5.0], 'class_weight': [None, 'balanced']
-#            }
+def load_input_css():
+    """Styles des zones de texte et des boutons"""
+    st.markdown("""
+        <style>
+        /* ✅ Boîte de texte plus lisible */
+        textarea, .stTextArea textarea {
+            background-color: #ffffff !important;
+            color: #000000 !important;
+            font-size: 16px !important;
         }
-        
-        # Structures de suivi
-        self.label_encoders = {}
-        self.hierarchy_predictors = {}
-        self.best_models = {}
-        self.hierarchy_structure = {}
-        self.models_directory = "saved_models"
-        self.use_smote = True
-        
-        if not os.path.exists(self.models_directory):
-            os.makedirs(self.models_directory)
-    
-    # ----------------------------------------------------------------
-    # UTILS
-    # ----------------------------------------------------------------
 
-    def get_data_hash(self, df):
-        """Génère un hash unique pour les données"""
-        data_string = pd.util.hash_pandas_object(df[['reponse', 'Classe', 'Grand poste', 'Section', 'Groupe']], index=True).values
-        return hashlib.md5(str(data_string).encode()).hexdigest()[:8]
-    
-    def get_model_filename(self, data_hash, prediction_level):
-        """Génère le nom de fichier pour sauvegarder le modèle"""
-        return os.path.join(self.models_directory, f"enhanced_predictor_{prediction_level}_{data_hash}.pkl")
-    
-    def save_models(self, filename):
-        """Sauvegarde tous les modèles et encodeurs optimisés"""
-        model_data = {
-            'vectorizer': self.vectorizer,
-            'label_encoders': self.label_encoders,
-            'hierarchy_predictors': self.hierarchy_predictors,
-            'best_models': self.best_models,
-            'hierarchy_structure': self.hierarchy_structure,
-            'timestamp': datetime.now().isoformat(),
-            'use_smote': self.use_smote
+        /* ✅ Boutons mieux visibles */
+        .stButton>button {
+            background-color: #6c63ff !important;
+            color: white !important;
+            border-radius: 10px !important;
+            font-weight: bold;
         }
-        
-        with open(filename, 'wb') as f:
-            pickle.dump(model_data, f)
-        
-        st.success(f"Meilleurs modèles sauvegardés: {filename}")
-    
-    def load_models(self, filename):
-        """Charge les modèles sauvegardés"""
-        try:
-            with open(filename, 'rb') as f:
-                model_data = pickle.load(f)
-            
-            self.vectorizer = model_data['vectorizer']
-            self.label_encoders = model_data['label_encoders']
-            self.hierarchy_predictors = model_data.get('hierarchy_predictors', {})
-            self.best_models = model_data.get('best_models', {})
-            self.hierarchy_structure = model_data.get('hierarchy_structure', {})
-            self.use_smote = model_data.get('use_smote', True)
-            
-            timestamp = model_data.get('timestamp', 'Inconnu')
-            st.success(f"Modèles optimisés chargés (sauvegardés le: {timestamp[:19]})")
-            return True
-        except Exception as e:
-            st.warning(f"Impossible de charger les modèles: {e}")
-            return False
-    
-    def models_exist(self, filename):
-        """Vérifie si les modèles sauvegardés existent"""
-        return os.path.exists(filename)
-    
-    # ----------------------------------------------------------------
-    # STRUCTURE HIÉRARCHIQUE
-    # ----------------------------------------------------------------
-
-    def build_hierarchy_structure(self, df):
-        """Construit la structure hiérarchique complète"""
-        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
-        self.hierarchy_structure = {}
-        
-        for _, row in df.iterrows():
-            current_level = self.hierarchy_structure
-            
-            for level in hierarchy_levels:
-                value = row[level]
-                if value not in current_level:
-                    current_level[value] = {}
-                current_level = current_level[value]
-        
-        return self.hierarchy_structure
-    
-    def get_filtered_options(self, level, parent_selections):
-        """Obtient les options filtrées pour un niveau donné basé sur les sélections parentes"""
-        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
-        level_index = hierarchy_levels.index(level)
-        
-        current_structure = self.hierarchy_structure
-        
-        # Naviguer dans la structure selon les sélections parentes
-        for i in range(level_index):
-            parent_level = hierarchy_levels[i]
-            if parent_level in parent_selections and parent_selections[parent_level]:
-                if parent_selections[parent_level] in current_structure:
-                    current_structure = current_structure[parent_selections[parent_level]]
-                else:
-                    return []
-        
-        return list(current_structure.keys()) if isinstance(current_structure, dict) else []
-    
-    def get_unique_prediction_path(self, selections):
-        """Vérifie si le chemin sélectionné mène à une classe unique"""
-        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
-        current_structure = self.hierarchy_structure
-        
-        for level in hierarchy_levels:
-            if level in selections and selections[level]:
-                if selections[level] in current_structure:
-                    current_structure = current_structure[selections[level]]
-                    
-                    # Si nous sommes au niveau Classe et qu'il n'y a qu'une seule option
-                    if level == 'Classe' and len(current_structure) == 0:
-                        return True, selections[level]
-                    elif level != 'Classe' and isinstance(current_structure, dict) and len(current_structure) == 1:
-                        # S'il n'y a qu'une seule option au niveau suivant
-                        next_level_index = hierarchy_levels.index(level) + 1
-                        if next_level_index < len(hierarchy_levels):
-                            next_level = hierarchy_levels[next_level_index]
-                            return False, list(current_structure.keys())[0]
-                else:
-                    return False, None
-        
-        return False, None
-    
-    # ----------------------------------------------------------------
-    # PRÉTRAITEMENT
-    # ----------------------------------------------------------------
-    def preprocess_text(self, text, language='auto'):
-        """Preprocessing du texte adapté à la langue"""
-        text = str(text).lower()
-        text = re.sub(r'[^\w\s\àâäéèêëïîôöùûüÿñç]', ' ', text)
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
-    
-    def check_class_imbalance(self, y, threshold=0.1):
-        """Vérifie le déséquilibre des classes"""
-        class_counts = Counter(y)
-        total_samples = len(y)
-        min_class_ratio = min(class_counts.values()) / total_samples
-        
-        if min_class_ratio < threshold:
-            return True
-        return False
-    
-    def prepare_data(self, df, prediction_level='Classe'):
-        """Préparation des données"""
-        df['reponse_clean'] = df.apply(
-            lambda row: self.preprocess_text(row['reponse'], row.get('langage', 'auto')), 
-            axis=1
-        )
-        
-        # Construire la structure hiérarchique
-        self.build_hierarchy_structure(df)
-        
-        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
-        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
-        
-        for level in target_levels:
-            if level not in self.label_encoders:
-                le = LabelEncoder()
-                df[f'{level}_encoded'] = le.fit_transform(df[level])
-                self.label_encoders[level] = le
-        
-        return df
-    
-    # ----------------------------------------------------------------
-    # ENTRAÎNEMENT AVEC PRISE EN COMPTE DES CORRECTIONS
-    # ----------------------------------------------------------------
-
-    def train_hierarchical_models(self, df, prediction_level='Classe'):
-        """Compare Naive Bayes et Logistic Regression à chaque niveau hiérarchique"""
-        # 🔁 Recalcul complet du TF-IDF (intègre les corrections)
-        self.vectorizer = TfidfVectorizer(
-            max_features=10000, ngram_range=(1, 3),
-            lowercase=True, analyzer='word', min_df=1, max_df=0.95
-        )
-
-        X = self.vectorizer.fit_transform(df['reponse_clean'])
-        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
-        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
-
-        progress_bar = st.progress(0)
-        status = st.empty()
-
-        for idx, level in enumerate(target_levels):
-            status.info(f"🔄 Entraînement au niveau: {level}")
-            progress_bar.progress((idx + 1) / len(target_levels))
+        </style>
+    """, unsafe_allow_html=True)
 
-            encoded_col = f'{level}_encoded'
-            if encoded_col not in df.columns:
-                continue
 
-            y = df[encoded_col]
-            if len(y.unique()) < 2:
-                st.warning(f"Pas assez de classes pour {level}")
-                continue
+def setup_page():
+    """Mise en place de la page, appelée au début de main() (aucun effet à l'import du module)"""
+    configure_page()
+    load_layout_css()
+    load_input_css()
 
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42, stratify=y
-            )
 
-#            if predictor.use_smote:
-#                smote = SMOTE(random_state=42)
-#                X_train, y_train = smote.fit_resample(X_train, y_train)
-
-            best_model, best_name, best_score = None, None, 0.0
-            for model_name, model in self.base_models.items():
-                param_grid = {f"classifier__{k}": v for k, v in self.param_grids[model_name].items()}
-                pipeline = Pipeline([('classifier', model)])
-                grid = GridSearchCV(
-                    pipeline, param_grid, cv=StratifiedKFold(3, shuffle=True, random_state=42),
-                    scoring='f1_weighted', n_jobs=1
-                )
-                grid.fit(X_train, y_train)
-                if grid.best_score_ > best_score:
-                    best_model, best_name, best_score = grid.best_estimator_, model_name, grid.best_score_
-
-            self.best_models[level] = {
-                'name': best_name,
-                'model': best_model,
-                'score': best_score
-            }
-            st.success(f"✅ {level}")
-            st.success(f"✅ {level}: {best_name} (F1={best_score:.3f})")
-
-
-        progress_bar.empty()
-        status.empty()
-
-        # Initialisation des encodeurs de labels pour chaque niveau
-#        label_encoders = {}
-        
-#        for level in target_levels:
-#            if level not in label_encoders:
-#                le = LabelEncoder()
-#                df[f'{level}_encoded'] = le.fit_transform(df[level])
-#                label_encoders[level] = le  # Conserver l'encodeur pour une utilisation ultérieure
-
-        # Calculer et afficher le rapport de classification
-        y_pred = best_model.predict(X_test)
-        report = classification_report(y_test, y_pred)#, target_names=le.classes_)
+def streamlit_message(level, message):
+    """Affiche un message du prédicteur dans l'interface"""
+    if level == 'report':
         st.markdown("### Rapport de Classification")
-        st.text(report)
-
-    # ----------------------------------------------------------------
-    # PRÉDICTION
-    # ----------------------------------------------------------------
-
-    def predict_hierarchy(self, text, prediction_level='Classe'):
-        text_clean = self.preprocess_text(text)
-        X = self.vectorizer.transform([text_clean])
-        predictions, probabilities = {}, {}
-        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
-        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
-
-        for level in target_levels:
-            if level not in self.best_models:
-                predictions[level] = "Non disponible"
-                probabilities[level] = 0.0
-                continue
-
-            model = self.best_models[level]['model']
-            pred = model.predict(X)[0]
-            proba = model.predict_proba(X)[0] if hasattr(model, 'predict_proba') else [1.0]
-            label = self.label_encoders[level].inverse_transform([pred])[0]
-            confidence = max(proba) if len(proba) > 0 else 0.0
-
-            predictions[level] = label
-            probabilities[level] = confidence
-
-        return predictions, probabilities
-
+        st.text(message)
+    else:
+        {'success': st.success, 'warning': st.warning, 'error': st.error}.get(level, st.info)(message)
+
+def make_streamlit_progress():
+    """Crée le suivi de progression (barre + statut) d'une tâche du prédicteur"""
+    widgets = {}
+    
+    def on_progress(fraction, message=None):
+        if fraction is None:
+            for widget in widgets.values():
+                widget.empty()
+            widgets.clear()
+            return
+        if not widgets:
+            widgets['bar'] = st.progress(0)
+            widgets['status'] = st.empty()
+        if message:
+            widgets['status'].info(message)
+        widgets['bar'].progress(fraction)
+    
+    return on_progress
+
+def use_streamlit_feedback(predictor):
+    """Relie les messages et la progression du prédicteur aux composants Streamlit"""
+    predictor.on_message = streamlit_message
+    predictor.on_progress = make_streamlit_progress()
+    return predictor
 
 def create_hierarchy_selector(df, predictor):
     """Crée les sélecteurs hiérarchiques avancés dans la sidebar"""
@@ -1068,18 +804,21 @@ def create_hierarchy_selector(df, predictor):
     hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
     selections = {}
     
+    # Index de la hiérarchie partagé avec le décodage contraint (None sans structure)
+    hierarchy_index = predictor.get_hierarchy_index() if predictor.hierarchy_structure else None
+    
     # Section d'information sur la structure hiérarchique (simplifiée)
     with st.sidebar.expander("📊 Niveaux disponibles", expanded=False):
         for level in hierarchy_levels:
-            unique_count = df[level].nunique()
+            unique_count = hierarchy_index.distinct_labels(level) if hierarchy_index else df[level].nunique()
             st.markdown(f"**{level}:** {unique_count} catégories")
     
     st.sidebar.markdown("---")
     
     # Sélecteurs hiérarchiques progressifs
     for i, level in enumerate(hierarchy_levels):
-        if hasattr(predictor, 'hierarchy_structure') and predictor.hierarchy_structure:
-            available_options = predictor.get_filtered_options(level, selections)
+        if hierarchy_index is not None:
+            available_options = hierarchy_index.options(level, selections)
         else:
             if i == 0:
                 available_options = sorted(df[level].unique())
@@ -1115,47 +854,40 @@ def create_hierarchy_selector(df, predictor):
     
     return selections
 
-def process_batch_file(file_data, text_column):
-    """Traite un fichier pour la prédiction par lot"""
+# Nombre de lignes de résultats affichées à l'écran (l'export contient tout le lot)
+BATCH_PREVIEW_ROWS = 1000
+
+def process_batch_file(file_data, text_column, chunk_size=1000):
+    """Prépare la lecture par blocs d'un fichier pour la prédiction par lot"""
     try:
-        if file_data.name.endswith('.csv'):
-            df = pd.read_csv(file_data)
-        elif file_data.name.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file_data)
-        elif file_data.name.endswith('.txt'):
-            content = file_data.read().decode('utf-8')
-            texts = [line.strip() for line in content.split('\n') if line.strip()]
-            df = pd.DataFrame({'texte': texts})
-            text_column = 'texte'
-        else:
-            return None, None, "Format de fichier non supporté"
+        reader = BatchTextReader(file_data, text_column, chunk_size)
         
-        if text_column not in df.columns:
-            return None, None, f"Colonne '{text_column}' introuvable"
+        if reader.text_column not in reader.columns():
+            return None, f"Colonne '{text_column}' introuvable"
         
-        texts = df[text_column].dropna().astype(str).tolist()
-        return df, texts, None
+        return reader, None
         
+    except ValueError as e:
+        return None, str(e)
     except Exception as e:
-        return None, None, f"Erreur lors du traitement: {e}"
+        return None, f"Erreur lors du traitement: {e}"
 
-def create_batch_results_table(texts, predictions, probabilities, prediction_level):
+def create_batch_results_table(texts, batch_predictions, prediction_level):
     """Crée un tableau des résultats de prédiction par lot"""
     hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
     display_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
     
-    results_data = []
-    for i, text in enumerate(texts):
-        row = {'Texte': text[:100] + '...' if len(text) > 100 else text}
-        
-        for level in display_levels:
-            if i < len(predictions) and level in predictions[i]:
-                row[f'{level}'] = predictions[i][level]
-                row[f'Confiance_{level}'] = f"{probabilities[i][level]:.2%}"
-        
-        results_data.append(row)
+    texts = pd.Series(texts[:len(batch_predictions)], dtype=object)
+    results_df = pd.DataFrame({
+        'Texte': texts.where(texts.str.len() <= 100, texts.str[:100] + '...').values
+    })
+    
+    for level in display_levels:
+        if level in batch_predictions.columns:
+            results_df[level] = batch_predictions[level].values
+            results_df[f'Confiance_{level}'] = [f"{conf:.2%}" for conf in batch_predictions[f'Confiance_{level}']]
     
-    return pd.DataFrame(results_data)
+    return results_df
 
 def create_prediction_analysis(predictions, probabilities, hierarchy_levels, selected_categories=None):
     """Crée une analyse détaillée des prédictions"""
@@ -1237,6 +969,7 @@ def create_prediction_analysis(predictions, probabilities, hierarchy_levels, sel
     if confidence_data:
         conf_df = pd.DataFrame(confidence_data)
         
+        import plotly.graph_objects as go
         fig_conf = go.Figure(data=[
             go.Bar(
                 x=conf_df["Niveau"],
@@ -1308,9 +1041,13 @@ def create_prediction_analysis(predictions, probabilities, hierarchy_levels, sel
 #        st.error(f"Erreur lors de la mise à jour: {e}")
 #        return df_prepared, False
 
-def update_model_with_corrections(predictor, df_prepared, corrections, prediction_level):
-    """Met à jour le modèle avec les corrections fournies."""
+def update_model_with_corrections(predictor, df_prepared, corrections, prediction_level, full_rebuild=False):
+    """
+    Met à jour le modèle avec les corrections fournies (incrémental, ou ré-entraînement complet).
+    La sauvegarde n'est pas faite ici : elle est confiée à un job en arrière-plan après publication.
+    """
     try:
+        use_streamlit_feedback(predictor)
         new_data = []
         for correction in corrections:
             new_data.append({
@@ -1324,28 +1061,32 @@ def update_model_with_corrections(predictor, df_prepared, corrections, predictio
         
         correction_df = pd.DataFrame(new_data)
         updated_df = pd.concat([df_prepared, correction_df], ignore_index=True)
-
-        # Re-encoder toutes les classes dans le DataFrame mis à jour
         hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
-        for level in hierarchy_levels:
-            if level in predictor.label_encoders:
-                le = predictor.label_encoders[level]
-                all_classes = sorted(set(list(le.classes_) + list(updated_df[level].unique())))
-                
-                new_le = LabelEncoder()
-                new_le.fit(all_classes)
-                updated_df[f'{level}_encoded'] = new_le.transform(updated_df[level])
-                predictor.label_encoders[level] = new_le
 
-        # Réentraîner le modèle sur les données mises à jour
-        predictor.train_hierarchical_models(updated_df, prediction_level)
+        # Mise à jour incrémentale : comptes des modèles mis à jour en place
+        incremental = not full_rebuild and predictor.partial_fit_corrections(correction_df, prediction_level)
         
-        # Sauvegarde du modèle
-        data_hash = predictor.get_data_hash(updated_df)
-        model_filename = predictor.get_model_filename(data_hash, prediction_level)
-        predictor.save_models(model_filename)  # Sauvegarde des modèles
+        if incremental:
+            for level in hierarchy_levels:
+                if level in predictor.label_encoders:
+                    updated_df[f'{level}_encoded'] = predictor.label_encoders[level].transform(updated_df[level])
+        else:
+            predictor.build_hierarchy_structure(updated_df)
+
+            # Re-encoder toutes les classes dans le DataFrame mis à jour
+            for level in hierarchy_levels:
+                if level in predictor.label_encoders:
+                    le = predictor.label_encoders[level]
+                    all_classes = sorted(set(list(le.classes_) + list(updated_df[level].unique())))
+                    
+                    new_le = LabelEncoder()
+                    new_le.fit(all_classes)
+                    updated_df[f'{level}_encoded'] = new_le.transform(updated_df[level])
+                    predictor.label_encoders[level] = new_le
+
+            # Réentraîner le modèle sur les données mises à jour
+            predictor.train_hierarchical_models(updated_df, prediction_level)
 
-        st.success("🎯 Modèle mis à jour et sauvegardé avec succès !")
         return updated_df, True
 
     except Exception as e:
@@ -1359,6 +1100,65 @@ def update_model_with_corrections(predictor, df_prepared, corrections, predictio
 #    st.success(f"Prédiction après mise à jour pour '{test_text}': {predictions} avec confiance {probabilities}")
 
 
+class PredictorRegistry:
+    """
+    Registre des prédicteurs chargés, partagé par toutes les sessions du processus.
+    
+    Les entrées (prédicteur + données préparées) sont en lecture seule : une mise à
+    jour publie une nouvelle entrée qui remplace l'ancienne de façon atomique.
+    Au-delà de max_entries, l'entrée la moins récemment utilisée est libérée.
+    """
+    
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Retourne l'entrée associée à la clé (None si absente)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def publish(self, key, predictor, df_prepared):
+        """Publie (ou remplace) l'entrée d'une clé"""
+        entry = {'predictor': predictor, 'df_prepared': df_prepared}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+@st.cache_resource
+def get_predictor_registry():
+    """Registre unique des prédicteurs pour tout le processus Streamlit"""
+    return PredictorRegistry()
+
+
+@st.cache_resource
+def get_training_runner():
+    """Exécuteur unique des entraînements en arrière-plan pour tout le processus Streamlit"""
+    return TrainingJobRunner(os.path.join("saved_models", "jobs"))
+
+
+@st.fragment(run_every=2)
+def training_status_panel(runner, job_id):
+    """Avancement d'un entraînement en arrière-plan (rafraîchi toutes les 2 s, page rechargée à la fin)"""
+    job = runner.get(job_id)
+    if job is None or job['status'] not in ACTIVE_STATES:
+        st.rerun()
+    st.progress(min(job['progress'], 1.0), text=f"⏳ {job['message']} ({job['progress']:.0%})")
+    st.caption(f"Entraînement en arrière-plan - job {job_id}")
+
+
+# Fichier de données par défaut
+DATA_PATH = os.path.join("Data", "Data.xlsx")
+
+
 @st.cache_data
 def load_data(file_data=None):
     """Chargement des données avec cache"""
@@ -1371,9 +1171,8 @@ def load_data(file_data=None):
             return None
     else:
         try:
-            data_path = os.path.join("Data", "Data.xlsx")
-            if os.path.exists(data_path):
-                df = pd.read_excel(data_path)
+            if os.path.exists(DATA_PATH):
+                df = pd.read_excel(DATA_PATH)
                 return df
             else:
                 st.warning(f"Fichier Data.xlsx introuvable dans le dossier Data/")
@@ -1388,6 +1187,9 @@ def main():
     # Initialisation du prédicteur
 #    predictor = EnhancedHierarchicalPredictor()  
 
+    # Configuration de la page : doit précéder tout autre élément Streamlit
+    setup_page()
+
     # Afficher uniquement les logos en position fixe
     display_fixed_logos()
 
@@ -1679,6 +1481,18 @@ def main():
     use_smote = st.sidebar.checkbox("Activer SMOTE (suréchantillonnage)", value=True, 
                                    help="Corrige les déséquilibres de classes")
     
+    feature_backend_label = st.sidebar.selectbox(
+        "Moteur de caractéristiques",
+        options=list(EnhancedHierarchicalPredictor.FEATURE_BACKENDS),
+        index=0,
+        help="Le hachage n'a pas de vocabulaire : mémoire bornée quel que soit le volume d'entraînement"
+    )
+    feature_backend = EnhancedHierarchicalPredictor.FEATURE_BACKENDS[feature_backend_label]
+    use_char_ngrams = st.sidebar.checkbox(
+        "N-grammes de caractères", value=False,
+        help="Ajoute des n-grammes de caractères (3-5), robustes aux fautes de frappe ; plus coûteux en mémoire"
+    )
+    
     # Sélection du niveau de prédiction
     prediction_level = st.sidebar.selectbox(
         "Niveau de prédiction maximum",
@@ -1687,20 +1501,46 @@ def main():
         help="Niveau hiérarchique jusqu'auquel prédire"
     )
     
+    joint_decoding = st.sidebar.checkbox(
+        "Décodage hiérarchique cohérent", value=True,
+        help="Choisit le meilleur chemin valide Grand poste → Section → Groupe → Classe"
+    )
+    
+    cpu_count = os.cpu_count() or 1
+    n_jobs = 1
+    if cpu_count > 1:
+        n_jobs = st.sidebar.slider(
+            "Cœurs pour l'entraînement",
+            min_value=1, max_value=cpu_count, value=cpu_count,
+            help="Les niveaux hiérarchiques et les plis de validation croisée sont entraînés en parallèle"
+        )
+    
     # Information sur le modèle disponible (CPU optimisé)
     st.sidebar.markdown("#### 🤖 Modèle utilisé")
 #    st.sidebar.info("**MultinomialNB** - Optimisé pour CPU")
     st.sidebar.markdown("*Paramètres optimisés automatiquement*")
     
     # Initialisation du prédicteur
-    predictor = EnhancedHierarchicalPredictor()
+    predictor = EnhancedHierarchicalPredictor(feature_backend=feature_backend, use_char_ngrams=use_char_ngrams)
+    use_streamlit_feedback(predictor)
     predictor.use_smote = use_smote
-    
-    # Préparer les données et construire la structure hiérarchique
-    df_prepared = predictor.prepare_data(df, prediction_level)
+    predictor.n_jobs = n_jobs
+    
+    # Modèle partagé entre sessions : (niveau, données, SMOTE, caractéristiques) identifie une entrée
+    registry = get_predictor_registry()
+    # Empreinte mémorisée pour le fichier par défaut : inchangé, il n'est pas re-haché
+    data_hash = predictor.get_data_hash(df, source_path=DATA_PATH if uploaded_file is None else None)
+    cache_key = (prediction_level, data_hash, use_smote, feature_backend, use_char_ngrams)
+    shared = registry.get(cache_key)
+    
+    # Préparer les données et construire la structure hiérarchique (sauf si déjà partagées)
+    if shared is not None:
+        ui_predictor, df_prepared = shared['predictor'], shared['df_prepared']
+    else:
+        ui_predictor, df_prepared = predictor, predictor.prepare_data(df, prediction_level, data_hash)
     
     # Sélecteurs hiérarchiques dans la sidebar
-    hierarchy_selections = create_hierarchy_selector(df_prepared, predictor)
+    hierarchy_selections = create_hierarchy_selector(df_prepared, ui_predictor)
     
     # Affichage des informations sur les sélections
     if hierarchy_selections:
@@ -1709,17 +1549,17 @@ def main():
             st.sidebar.markdown(f"**{level}:** {selection}")
         
         # Vérifier si c'est un cas unique
-        if hasattr(predictor, 'hierarchy_structure'):
-            is_unique, unique_class = predictor.get_unique_prediction_path(hierarchy_selections)
+        if hasattr(ui_predictor, 'hierarchy_structure'):
+            is_unique, unique_class = ui_predictor.get_unique_prediction_path(hierarchy_selections)
             if is_unique:
                 st.sidebar.success("✅ Classification unique identifiée")
     
-    # Gestion de l'entraînement des modèles
-    data_hash = predictor.get_data_hash(df_prepared)
-    model_filename = predictor.get_model_filename(data_hash, prediction_level)
+    # Gestion de l'entraînement des modèles (chaque entraînement crée une nouvelle version)
+    model_filename = predictor.find_saved_model(data_hash, prediction_level)
+    runner = get_training_runner()
     
     st.sidebar.subheader("🧠 Gestion des Modèles")
-    models_exist = predictor.models_exist(model_filename)
+    models_exist = model_filename is not None and predictor.models_exist(model_filename)
     
     if models_exist:
         st.sidebar.success("Modèles trouvés")
@@ -1729,47 +1569,55 @@ def main():
         use_saved = False
         force_retrain = False
     
-    # Cache pour les modèles
-    cache_key = f"enhanced_predictor_{prediction_level}_{data_hash}_{use_smote}"
-    
-    # Entraînement ou chargement
+    # Chargement (une seule fois par processus, puis partagé)
     if models_exist and use_saved and not force_retrain:
-        if cache_key not in st.session_state:
+        if shared is None:
             with st.spinner("Chargement des modèles..."):
-                try:
-                    if predictor.load_models(model_filename):
-                        st.session_state[cache_key] = {
-                            'predictor': predictor,
-                            'df_prepared': df_prepared
-                        }
-                        st.sidebar.success("Modèles chargés avec succès")
-                except Exception as e:
-                    st.sidebar.error(f"Erreur de chargement: {e}")
-                    force_retrain = True
-    
-    if cache_key not in st.session_state or force_retrain:
-        with st.spinner("Entraînement des modèles en cours..."):
-#            st.info("🚀 Optimisation MultinomialNB en cours...")
-            
-            try:
-                predictor.train_hierarchical_models(df_prepared, prediction_level)
-                
-                # Sauvegarder
-                predictor.save_models(model_filename)
-                
-                st.session_state[cache_key] = {
-                    'predictor': predictor,
-                    'df_prepared': df_prepared
-                }
-                
-            #    st.balloons()
-                
-            except Exception as e:
-                st.error(f"Erreur lors de l'entraînement: {e}")
-                return
+                if predictor.load_models(model_filename):
+                    shared = registry.publish(cache_key, predictor, df_prepared)
+                    st.sidebar.success("Modèles chargés avec succès")
+                else:
+                    st.sidebar.error("Erreur de chargement des modèles sauvegardés")
+    
+    # Entraînement en arrière-plan : le modèle publié reste servi pendant le job, puis
+    # le nouveau prédicteur le remplace pour toutes les sessions
+    job = runner.latest(cache_key)
+    if shared is None and job is not None and job['status'] == 'failed':
+        st.error(f"Erreur lors de l'entraînement: {job['error']}")
+        force_retrain = st.button("🔄 Relancer l'entraînement")
+    
+    if force_retrain or (shared is None and (job is None or job['status'] == 'succeeded')):
+        job_id = runner.submit(
+            cache_key, df, prediction_level, data_hash, predictor.get_model_filename(data_hash, prediction_level),
+            predictor_options={
+                'feature_backend': feature_backend, 'use_char_ngrams': use_char_ngrams,
+                'use_smote': use_smote, 'n_jobs': n_jobs,
+            },
+            on_success=lambda trained, prepared: registry.publish(cache_key, trained, prepared)
+        )
+        job = runner.get(job_id)
+    
+    if job is not None and job['status'] in ACTIVE_STATES:
+        with st.sidebar:
+            training_status_panel(runner, job['job_id'])
+    elif job is not None and job['status'] == 'failed' and shared is not None:
+        st.sidebar.error(f"Échec du ré-entraînement, modèle précédent conservé: {job['error']}")
+    
+    # Sauvegarde en arrière-plan du dernier modèle mis à jour par corrections
+    save_job = runner.latest(cache_key, kind='save')
+    if save_job is not None and save_job['status'] in ACTIVE_STATES:
+        st.sidebar.caption(f"💾 {save_job['message']} - job {save_job['job_id']}")
+    elif save_job is not None and save_job['status'] == 'failed':
+        st.sidebar.warning(f"Modèle mis à jour mais non sauvegardé: {save_job['error']}")
+    
+    if shared is None:
+        if job is not None and job['status'] in ACTIVE_STATES:
+            st.info("🚀 Entraînement des modèles en arrière-plan : l'application s'affichera dès "
+                    "que le modèle sera prêt (mise à jour automatique)")
+        return
     
-    predictor = st.session_state[cache_key]['predictor']
-    df_prepared = st.session_state[cache_key]['df_prepared']
+    predictor = shared['predictor']
+    df_prepared = shared['df_prepared']
     
     # Interface principale avec deux colonnes principales
     main_col1, main_col2 = st.columns([3, 1])
@@ -1813,7 +1661,7 @@ def main():
             if predict_button and user_input:
                 with st.spinner("Analyse en cours..."):
                     try:
-                        predictions, probabilities = predictor.predict_hierarchy(user_input, prediction_level)
+                        predictions, probabilities = predictor.predict_hierarchy(user_input, prediction_level, joint=joint_decoding)
                         
                         st.markdown("### 📊 Résultats de la prédiction")
                         
@@ -1847,6 +1695,7 @@ def main():
                                       if predictions.get(level) not in ["Modèle non disponible", "Erreur de prédiction"]]
                         
                         if valid_levels:
+                            import plotly.graph_objects as go
                             fig = go.Figure(data=[
                                 go.Bar(
                                     x=valid_levels,
@@ -1875,7 +1724,9 @@ def main():
             if guided_button and user_input:
                 with st.spinner("Analyse guidée en cours..."):
                     try:
-                        predictions, probabilities = predictor.predict_hierarchy(user_input, prediction_level)
+                        predictions, probabilities = predictor.predict_hierarchy(
+                            user_input, prediction_level, joint=joint_decoding, selections=hierarchy_selections
+                        )
                         
                         # Définir les niveaux hiérarchiques pour l'analyse
                         hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
@@ -1938,179 +1789,160 @@ def main():
                 with col_config2:
                     batch_size = st.slider(
                         "Taille du lot:",
-                        min_value=10,
-                        max_value=500,
-                        value=100
+                        min_value=100,
+                        max_value=10000,
+                        value=1000,
+                        step=100
                     )
+                    
+                    batch_guided = False
+                    if hierarchy_selections:
+                        batch_guided = st.checkbox(
+                            "🧭 Appliquer les sélections de la sidebar",
+                            value=False,
+                            help="Contraint toutes les prédictions du fichier aux descendants des sélections"
+                        )
+                
+                # Options d'exportation : choisies avant le traitement, les résultats
+                # étant écrits dans le fichier d'export au fil des blocs
+                with st.expander("📥 Options d'exportation", expanded=True):
+                    export_col1, export_col2 = st.columns([1, 2])
+                    
+                    with export_col1:
+                        export_format = st.selectbox(
+                            "Format d'export",
+                            options=["Excel (.xlsx)", "CSV (.csv)"],
+                            index=0,
+                            help="Choisissez le format du fichier d'export"
+                        )
+                    
+                    with export_col2:
+                        include_confidence = st.checkbox("✓ Niveaux de confiance", 
+                            value=True,
+                            help="Inclure les scores de confiance pour chaque prédiction")
+                        include_source = st.checkbox("✓ Données sources", 
+                            value=True,
+                            help="Inclure les textes originaux et prétraités")
+                        include_metadata = st.checkbox("✓ Métadonnées", 
+                            value=True,
+                            help="Inclure les informations sur le modèle et la date de prédiction")
                 
                 if st.button("📂 Traiter le lot", type="primary") and text_column:
                     with st.spinner("Traitement du fichier en cours..."):
-                        df_batch, texts_batch, error = process_batch_file(uploaded_batch_file, text_column)
+                        batch_reader, error = process_batch_file(uploaded_batch_file, text_column, batch_size)
                         
                         if error:
                             st.error(f"Erreur: {error}")
-                        elif texts_batch:
+                        else:
+                            # Colonnes exportées selon les options choisies
+                            hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+                            export_columns = ['Texte']
+                            for level in hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]:
+                                export_columns += [level, f'Confiance_{level}']
+                            if not include_confidence:
+                                export_columns = [col for col in export_columns if not is_confidence_column(col)]
+                            if not include_source:
+                                source_cols = ['texte_original', 'texte_pretraite']
+                                export_columns = [col for col in export_columns if col not in source_cols]
+                            
+                            metadata = {}
+                            if include_metadata:
+                                # Colonne Date_prediction pour traçabilité
+                                metadata['Date_prediction'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                            
+                            file_format = 'xlsx' if export_format == "Excel (.xlsx)" else 'csv'
+                            export_writer = StreamingExportWriter(file_format, export_columns, metadata)
+                            
                             progress_bar = st.progress(0)
                             status_text = st.empty()
                             
-                            total_texts = len(texts_batch)
-                            all_predictions = []
-                            all_probabilities = []
-                            
-                            for i in range(0, total_texts, batch_size):
-                                batch_texts = texts_batch[i:i + batch_size]
-                                status_text.text(f"Traitement: {i + 1}-{min(i + batch_size, total_texts)} sur {total_texts}")
-                                
-                                try:
-                                    for text in batch_texts:
-                                        pred, prob = predictor.predict_hierarchy(text, prediction_level)
-                                        all_predictions.append(pred)
-                                        all_probabilities.append(prob)
-                                except Exception as e:
-                                    st.error(f"Erreur lors du traitement: {e}")
-                                    break
-                                
-                                progress_bar.progress(min(1.0, (i + batch_size) / total_texts))
+                            # Lecture, prédiction et écriture bloc par bloc : ni le fichier source
+                            # ni l'ensemble des résultats ne sont chargés en entier
+                            preview_chunks = []
+                            preview_rows = 0
+                            # Compteurs propres à ce lot (le cache du prédicteur est partagé entre les sessions)
+                            batch_stats = {'rows_seen': 0, 'rows_scored': 0}
+                            try:
+                                for batch_texts in batch_reader:
+                                    start = batch_reader.rows_read - len(batch_texts)
+                                    status_text.text(f"Traitement: {start + 1}-{batch_reader.rows_read}")
+                                    
+                                    batch_predictions, chunk_stats = predictor.predict_hierarchy_batch(
+                                        batch_texts, prediction_level, joint=joint_decoding,
+                                        selections=hierarchy_selections if batch_guided else None,
+                                        return_stats=True
+                                    )
+                                    for key, value in chunk_stats.items():
+                                        batch_stats[key] += value
+                                    results_chunk = create_batch_results_table(batch_texts, batch_predictions, prediction_level)
+                                    export_writer.write(results_chunk)
+                                    
+                                    if preview_rows < BATCH_PREVIEW_ROWS:
+                                        preview_chunks.append(results_chunk.head(BATCH_PREVIEW_ROWS - preview_rows))
+                                        preview_rows += len(preview_chunks[-1])
+                                    
+                                    progress_bar.progress(batch_reader.progress)
+                                export_path = export_writer.close()
+                            except Exception as e:
+                                export_writer.discard()
+                                export_path = None
+                                st.error(f"Erreur lors du traitement: {e}")
                             
                             progress_bar.empty()
                             status_text.empty()
                             
-                            if all_predictions:
-                                st.success(f"Traitement terminé! {len(all_predictions)} textes classifiés")
-                                
-                                results_df = create_batch_results_table(
-                                    texts_batch, all_predictions, all_probabilities, prediction_level
-                                )
-                                
-                                st.markdown("### 📊 Résultats de la classification par lot")
-                                st.dataframe(results_df, use_container_width=True, height=400)
-                                
-                                # Options d'exportation
-                                with st.expander("📥 Options d'exportation", expanded=True):
-                                    export_col1, export_col2 = st.columns([1, 2])
-                                    
-                                    with export_col1:
-                                        export_format = st.selectbox(
-                                            "Format d'export",
-                                            options=["Excel (.xlsx)", "CSV (.csv)"],
-                                            index=0,
-                                            help="Choisissez le format du fichier d'export"
-                                        )
-                                    
-                                    with export_col2:
-                                        include_confidence = st.checkbox("✓ Niveaux de confiance", 
-                                            value=True,
-                                            help="Inclure les scores de confiance pour chaque prédiction")
-                                        include_source = st.checkbox("✓ Données sources", 
-                                            value=True,
-                                            help="Inclure les textes originaux et prétraités")
-                                        include_metadata = st.checkbox("✓ Métadonnées", 
-                                            value=True,
-                                            help="Inclure les informations sur le modèle et la date de prédiction")
-
-                                    # Bouton d'export unique qui déclenchera l'action
-                                    export_clicked = st.button("💾 Exporter les résultats", use_container_width=True)
-
-                                    # Ne procéder à l'export que si le bouton est cliqué
-                                    if export_clicked:
-                                        # Préparation des données pour l'export
-                                        export_df = results_df.copy()
-                                
-                                # Préparation des données d'export
-                                export_df = results_df.copy()
-                                
-                                # Ajout minimal des métadonnées (date/heure) si demandé
-                                metadata_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                                if include_metadata:
-                                    # Ajouter une colonne Date_prediction pour traçabilité
-                                    export_df['Date_prediction'] = metadata_date
-                                
-                                # Suppression des colonnes si non demandées
-                                if not include_confidence:
-                                    confidence_cols = [col for col in export_df.columns if 'confiance' in col.lower() or 'probabilité' in col.lower()]
-                                    export_df = export_df.drop(columns=confidence_cols, errors='ignore')
-                                
-                                if not include_source:
-                                    source_cols = ['texte_original', 'texte_pretraite']
-                                    export_df = export_df.drop(columns=[col for col in source_cols if col in export_df.columns])
-                                
-                                # Initialiser les variables de session pour les options d'export si elles n'existent pas
-                                if 'export_format' not in st.session_state:
-                                    st.session_state.export_format = export_format
-                                if 'include_metadata' not in st.session_state:
-                                    st.session_state.include_metadata = include_metadata
-
-                                # Export selon le format choisi
+                            # Un seul fichier d'export conservé par session
+                            previous_export = st.session_state.pop('batch_export', None)
+                            if previous_export and os.path.exists(previous_export['path']):
+                                os.remove(previous_export['path'])
+                            
+                            # Part des lignes servies sans recalcul (doublons du fichier, textes déjà vus)
+                            rows_seen, rows_scored = batch_stats['rows_seen'], batch_stats['rows_scored']
+                            
+                            if export_path and export_writer.rows_written:
                                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                                if st.session_state.export_format == "Excel (.xlsx)":
-                                    output = BytesIO()
-                                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                                        export_df.to_excel(writer, index=False, sheet_name='Prédictions')
-
-                                        # Feuille de métadonnées (date/heure uniquement)
-                                        if include_metadata:
-                                            pd.DataFrame([{'Date_prediction': metadata_date}]).to_excel(
-                                                writer,
-                                                sheet_name='Métadonnées',
-                                                index=False
-                                            )
-
-                                        # Appliquer le style conditionnel aux colonnes de confiance
-                                        try:
-                                            workbook = writer.book
-                                            worksheet = writer.sheets['Prédictions']
-
-                                            # Définir les fills
-                                            high_fill = PatternFill(start_color="FF28A745", end_color="FF28A745", fill_type="solid")
-                                            medium_fill = PatternFill(start_color="FFFFC107", end_color="FFFFC107", fill_type="solid")
-                                            low_fill = PatternFill(start_color="FFFF6B6B", end_color="FFFF6B6B", fill_type="solid")
-
-                                            # Parcourir les colonnes pour trouver celles de confiance
-                                            for idx, col in enumerate(export_df.columns, start=1):
-                                                if 'confiance' in col.lower() or 'probabilité' in col.lower():
-                                                    col_letter = get_column_letter(idx)
-                                                    for row_idx in range(2, len(export_df) + 2):
-                                                        cell = worksheet[f"{col_letter}{row_idx}"]
-                                                        val = cell.value
-                                                        v = None
-                                                        # Gérer les formats '12.34%' ou valeurs numériques
-                                                        try:
-                                                            if isinstance(val, str) and val.strip().endswith('%'):
-                                                                v = float(val.strip().replace('%', '')) / 100.0
-                                                            else:
-                                                                v = float(val)
-                                                        except Exception:
-                                                            v = None
-
-                                                        if v is not None:
-                                                            if v > 0.8:
-                                                                cell.fill = high_fill
-                                                            elif v > 0.6:
-                                                                cell.fill = medium_fill
-                                                            else:
-                                                                cell.fill = low_fill
-                                        except Exception as e:
-                                            # Si le styling échoue, on ne bloque pas l'export
-                                            import traceback
-                                            traceback.print_exc()
-
-                                    excel_data = output.getvalue()
-                                    st.download_button(
-                                        label="💾 Télécharger les résultats (Excel)",
-                                        data=excel_data,
-                                        file_name=f"predictions_hierarchiques_{timestamp}.xlsx",
-                                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                                    )
-                                else:
-                                    csv_data = export_df.to_csv(index=False)
-                                    st.download_button(
-                                        label="💾 Télécharger les résultats (CSV)",
-                                        data=csv_data,
-                                        file_name=f"predictions_hierarchiques_{timestamp}.csv",
-                                        mime="text/csv"
-                                    )
+                                st.session_state['batch_export'] = {
+                                    'path': export_path,
+                                    'rows': export_writer.rows_written,
+                                    'format': file_format,
+                                    'file_name': f"predictions_hierarchiques_{timestamp}.{file_format}",
+                                    'preview': pd.concat(preview_chunks, ignore_index=True),
+                                    'hit_rate': 1 - rows_scored / rows_seen if rows_seen else 0.0,
+                                }
+                            elif export_path:
+                                os.remove(export_path)
+                                st.warning("Aucun texte trouvé dans le fichier")
+                
+                # Résultats du dernier lot traité (conservés entre les réexécutions)
+                batch_export = st.session_state.get('batch_export')
+                if batch_export and os.path.exists(batch_export['path']):
+                    st.success(f"Traitement terminé! {batch_export['rows']} textes classifiés")
+                    st.caption(
+                        f"⚡ {batch_export['hit_rate']:.1%} des lignes servies sans recalcul "
+                        f"(doublons du fichier et textes déjà classés)"
+                    )
+                    
+                    st.markdown("### 📊 Résultats de la classification par lot")
+                    if batch_export['rows'] > len(batch_export['preview']):
+                        st.caption(f"Aperçu des {len(batch_export['preview'])} premières lignes sur {batch_export['rows']}")
+                    st.dataframe(batch_export['preview'], use_container_width=True, height=400)
+                    
+                    # Le téléchargement est servi depuis le fichier temporaire
+                    with open(batch_export['path'], 'rb') as export_file:
+                        if batch_export['format'] == 'xlsx':
+                            st.download_button(
+                                label="💾 Télécharger les résultats (Excel)",
+                                data=export_file,
+                                file_name=batch_export['file_name'],
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            )
                         else:
-                            st.warning("Aucun texte trouvé dans le fichier")
+                            st.download_button(
+                                label="💾 Télécharger les résultats (CSV)",
+                                data=export_file,
+                                file_name=batch_export['file_name'],
+                                mime="text/csv"
+                            )
         
 
     if st.session_state.get("mode_select", "Prédiction Manuelle") == "Mise à Jour Modèle":
@@ -2141,47 +1973,46 @@ def main():
         # 🧩 Sélecteurs hiérarchiques
         with col_correct:
             st.markdown("**Classifications correctes:**")
+            
+            # Options lues dans l'index de la hiérarchie (aucun filtrage du DataFrame)
+            hierarchy_index = predictor.get_hierarchy_index()
     
             correct_grand_poste = st.selectbox(
                 "Grand poste correct:",
-                options=[""] + sorted(df_prepared['Grand poste'].unique()),
+                options=[""] + hierarchy_index.options('Grand poste', {}),
                 key="correct_gp"
             )
     
             filtered_sections = (
-                df_prepared[df_prepared['Grand poste'] == correct_grand_poste]['Section'].unique()
+                hierarchy_index.options('Section', {'Grand poste': correct_grand_poste})
                 if correct_grand_poste else []
             )
             correct_section = st.selectbox(
                 "Section correcte:",
-                options=[""] + sorted(filtered_sections),
+                options=[""] + filtered_sections,
                 key="correct_section"
             )
     
             filtered_groups = (
-                df_prepared[
-                    (df_prepared['Grand poste'] == correct_grand_poste) &
-                    (df_prepared['Section'] == correct_section)
-                ]['Groupe'].unique()
+                hierarchy_index.options('Groupe', {'Grand poste': correct_grand_poste,
+                                                   'Section': correct_section})
                 if correct_section else []
             )
             correct_groupe = st.selectbox(
                 "Groupe correct:",
-                options=[""] + sorted(filtered_groups),
+                options=[""] + filtered_groups,
                 key="correct_groupe"
             )
     
             filtered_classes = (
-                df_prepared[
-                    (df_prepared['Grand poste'] == correct_grand_poste) &
-                    (df_prepared['Section'] == correct_section) &
-                    (df_prepared['Groupe'] == correct_groupe)
-                ]['Classe'].unique()
+                hierarchy_index.options('Classe', {'Grand poste': correct_grand_poste,
+                                                   'Section': correct_section,
+                                                   'Groupe': correct_groupe})
                 if correct_groupe else []
             )
             correct_classe = st.selectbox(
                 "Classe correcte:",
-                options=[""] + sorted(filtered_classes),
+                options=[""] + filtered_classes,
                 key="correct_classe"
             )
     
@@ -2224,6 +2055,11 @@ def main():
     
 
         with col_train:
+            full_rebuild = st.checkbox(
+                "Ré-entraînement complet",
+                value=False,
+                help="Par défaut, les corrections sont intégrées de façon incrémentale (vocabulaire conservé)"
+            )
             if st.button("🔄 Mettre à jour le modèle", type="primary"):
                 corrections = st.session_state.get("corrections", [])
                 if not corrections:
@@ -2247,11 +2083,22 @@ def main():
                         st.error("🚫 Aucune correction valide à intégrer. Vérifiez les champs hiérarchiques et le texte.")
                     else:
                         with st.spinner("Mise à jour du modèle en cours..."):
+                            # Copie de travail : le modèle partagé reste servi pendant la mise à jour
+                            updated_predictor = copy.deepcopy(predictor)
                             df_prepared, updated = update_model_with_corrections(
-                                predictor, df_prepared, valid_corrections, prediction_level
+                                updated_predictor, df_prepared, valid_corrections, prediction_level,
+                                full_rebuild=full_rebuild
                             )
                         if updated:
-                            st.success("🎯 Modèle mis à jour avec succès avec les corrections valides !")
+                            # Entrée publiée en lecture seule : plus de retours vers cette session
+                            updated_predictor.on_message = None
+                            updated_predictor.on_progress = None
+                            predictor = updated_predictor
+                            registry.publish(cache_key, predictor, df_prepared)
+                            # Empreinte des données et sauvegarde hors de la requête
+                            runner.submit_save(cache_key, predictor, df_prepared, prediction_level)
+                            st.success("🎯 Modèle mis à jour avec succès avec les corrections valides ! "
+                                       "Sauvegarde en arrière-plan.")
                             # Optionnel : vider les corrections après mise à jour
                             st.session_state.corrections = []
 
@@ -2266,7 +2113,7 @@ def main():
                             for correction in valid_corrections:
                                 test_text = correction['texte']
                                 actual_class = correction['Classe']
-                                predictions, probabilities = predictor.predict_hierarchy(test_text, prediction_level)
+                                predictions, probabilities = predictor.predict_hierarchy(test_text, prediction_level, joint=joint_decoding)
                                 
                                 st.write(f"Texte: {test_text}")
                                 st.write(f"Prédiction: {predictions} avec confiance {probabilities}")
@@ -0,0 +1,192 @@
+import io
+import os
+
+import pandas as pd
+
+
+class BatchTextReader:
+    """
+    Lecture par blocs des textes d'un fichier de lot, sans charger le fichier entier.
+
+    - CSV : pandas avec chunksize (seule la colonne de texte est lue)
+    - XLSX : openpyxl en mode read_only, itération ligne à ligne
+    - TXT : itération ligne à ligne (une ligne non vide = un texte)
+
+    La mémoire utilisée est bornée par la taille d'un bloc et non par celle du fichier.
+    Les valeurs manquantes sont ignorées ; iter_rows donne avec chaque bloc le numéro
+    de ligne de chaque texte dans la source (1 = première ligne de données), pour
+    rattacher les résultats aux lignes d'origine.
+
+    Args:
+        file_data: chemin ou fichier ouvert en binaire (ex. UploadedFile Streamlit)
+        text_column (str): colonne contenant les textes (ignorée pour les fichiers TXT)
+        chunk_size (int): nombre de textes par bloc
+    """
+
+    def __init__(self, file_data, text_column=None, chunk_size=1000):
+        self.file_data = file_data
+        self.name = str(getattr(file_data, 'name', file_data))
+        self.text_column = text_column
+        self.chunk_size = chunk_size
+        self.rows_read = 0
+        self.progress = 0.0
+
+        if self.name.endswith('.csv'):
+            self.format = 'csv'
+        elif self.name.endswith('.xlsx'):
+            self.format = 'xlsx'
+        elif self.name.endswith('.xls'):
+            self.format = 'xls'
+        elif self.name.endswith('.txt'):
+            self.format = 'txt'
+            self.text_column = 'texte'
+        else:
+            raise ValueError("Format de fichier non supporté")
+
+    # ----------------------------------------------------------------
+    # UTILS
+    # ----------------------------------------------------------------
+
+    def _open(self):
+        """Ouvre le fichier en binaire (ou rembobine le fichier fourni)"""
+        if isinstance(self.file_data, (str, os.PathLike)):
+            return open(self.file_data, 'rb')
+        self.file_data.seek(0)
+        return self.file_data
+
+    def _close(self, handle):
+        if handle is not self.file_data:
+            handle.close()
+
+    def _total_size(self, handle):
+        """Taille du fichier en octets, pour estimer la progression"""
+        size = getattr(self.file_data, 'size', None)
+        if size is None:
+            position = handle.tell()
+            size = handle.seek(0, io.SEEK_END)
+            handle.seek(position)
+        return max(int(size), 1)
+
+    def columns(self):
+        """Noms des colonnes du fichier (lecture de l'en-tête uniquement)"""
+        if self.format == 'txt':
+            return ['texte']
+
+        handle = self._open()
+        try:
+            if self.format == 'csv':
+                return pd.read_csv(handle, nrows=0).columns.tolist()
+            if self.format == 'xls':
+                return pd.read_excel(handle, nrows=0).columns.tolist()
+
+            from openpyxl import load_workbook
+            workbook = load_workbook(handle, read_only=True)
+            try:
+                header = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+            finally:
+                workbook.close()
+            return [str(value) for value in header if value is not None]
+        finally:
+            self._close(handle)
+
+    # ----------------------------------------------------------------
+    # LECTURE PAR BLOCS
+    # ----------------------------------------------------------------
+
+    def __iter__(self):
+        """Produit des listes de textes (valeurs manquantes ignorées)"""
+        for _, texts in self.iter_rows():
+            yield texts
+
+    def iter_rows(self):
+        """Produit des couples (numéros de ligne dans la source, textes) (valeurs manquantes ignorées)"""
+        self.rows_read = 0
+        self.progress = 0.0
+        readers = {
+            'csv': self._iter_csv,
+            'xlsx': self._iter_xlsx,
+            'xls': self._iter_xls,
+            'txt': self._iter_txt,
+        }
+        for rows, texts in readers[self.format]():
+            self.rows_read += len(texts)
+            if texts:
+                yield rows, texts
+        self.progress = 1.0
+
+    def _iter_csv(self):
+        handle = self._open()
+        try:
+            total_size = self._total_size(handle)
+            for chunk in pd.read_csv(handle, usecols=[self.text_column], chunksize=self.chunk_size):
+                self.progress = min(1.0, handle.tell() / total_size)
+                # Index continu d'un bloc à l'autre : position de la ligne parmi les données
+                column = chunk[self.text_column].dropna()
+                yield (column.index + 1).tolist(), column.astype(str).tolist()
+        finally:
+            self._close(handle)
+
+    def _iter_xlsx(self):
+        from openpyxl import load_workbook
+
+        handle = self._open()
+        workbook = load_workbook(handle, read_only=True)
+        try:
+            worksheet = workbook.active
+            rows = worksheet.iter_rows(values_only=True)
+            header = [str(value) if value is not None else None for value in next(rows, ())]
+            column_index = header.index(self.text_column)
+            total_rows = max((worksheet.max_row or 0) - 1, 1)
+
+            row_numbers, texts = [], []
+            for row_number, row in enumerate(rows, start=1):
+                value = row[column_index] if column_index < len(row) else None
+                if value is not None:
+                    row_numbers.append(row_number)
+                    texts.append(str(value))
+                if len(texts) >= self.chunk_size:
+                    self.progress = min(1.0, row_number / total_rows)
+                    yield row_numbers, texts
+                    row_numbers, texts = [], []
+            self.progress = 1.0
+            yield row_numbers, texts
+        finally:
+            workbook.close()
+            self._close(handle)
+
+    def _iter_xls(self):
+        # Ancien format binaire : pas de lecture en flux possible, lecture de la seule colonne utile
+        handle = self._open()
+        try:
+            column = pd.read_excel(handle, usecols=[self.text_column])[self.text_column]
+        finally:
+            self._close(handle)
+        column = column.dropna()
+        row_numbers, texts = (column.index + 1).tolist(), column.astype(str).tolist()
+        for start in range(0, len(texts), self.chunk_size):
+            self.progress = min(1.0, (start + self.chunk_size) / len(texts))
+            yield row_numbers[start:start + self.chunk_size], texts[start:start + self.chunk_size]
+
+    def _iter_txt(self):
+        handle = self._open()
+        try:
+            total_size = self._total_size(handle)
+            lines = io.TextIOWrapper(handle, encoding='utf-8', errors='replace')
+            row_numbers, texts = [], []
+            try:
+                for row_number, line in enumerate(lines, start=1):
+                    line = line.strip()
+                    if line:
+                        row_numbers.append(row_number)
+                        texts.append(line)
+                    if len(texts) >= self.chunk_size:
+                        self.progress = min(1.0, handle.tell() / total_size)
+                        yield row_numbers, texts
+                        row_numbers, texts = [], []
+                self.progress = 1.0
+                yield row_numbers, texts
+            finally:
+                # Ne pas fermer le fichier sous-jacent avec l'enveloppe texte
+                lines.detach()
+        finally:
+            self._close(handle)
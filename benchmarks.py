@@ -0,0 +1,244 @@
+"""
+Micro-benchmarks du classifieur hiérarchique.
+
+Usage:
+    python benchmarks.py            # tous les benchmarks
+    python benchmarks.py single_pass
+"""
+import sys
+import time
+
+import numpy as np
+
+
+def _best_time(func, repeat=5):
+    """Meilleur temps d'exécution (secondes) sur plusieurs répétitions"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def synthetic_corpus(n_rows, n_classes=200, seed=42):
+    """Génère des réponses synthétiques (mots et fautes réels de dico.py) et leurs classes"""
+    from dico import dictionnaire_fr, dictionnaire_en
+
+    rng = np.random.default_rng(seed)
+    words = set()
+    for dictionary in (dictionnaire_fr, dictionnaire_en):
+        for key, value in dictionary.items():
+            words.update(key.split())
+            words.update(value.split())
+    vocabulary = np.array(sorted(word for word in words if word.isalpha()))
+    labels = rng.integers(0, n_classes, size=n_rows)
+    texts = [
+        " ".join(vocabulary[(label * 17 + rng.integers(0, 40, size=6)) % len(vocabulary)])
+        for label in labels
+    ]
+    return texts, labels
+
+
+def bench_single_pass(n_rows=20000):
+    """Coût par niveau : predict + predict_proba contre un seul predict_proba"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+
+    texts, labels = synthetic_corpus(n_rows)
+    X = TfidfVectorizer().fit_transform(texts)
+    model = MultinomialNB().fit(X, labels)
+
+    def two_passes():
+        model.predict(X)
+        model.predict_proba(X).max(axis=1)
+
+    def single_pass():
+        proba = model.predict_proba(X)
+        best = proba.argmax(axis=1)
+        model.classes_[best], proba[np.arange(len(best)), best]
+
+    t_two = _best_time(two_passes)
+    t_one = _best_time(single_pass)
+    print(f"[single_pass] {n_rows} lignes, {len(model.classes_)} classes")
+    print(f"  predict + predict_proba : {t_two * 1000:8.1f} ms")
+    print(f"  predict_proba + argmax  : {t_one * 1000:8.1f} ms  (x{t_two / t_one:.2f})")
+
+
+def bench_prepare_data(n_rows=500000):
+    """Prétraitement d'une colonne : df.apply ligne à ligne contre normalize_texts"""
+    import pandas as pd
+    from text_utils import normalize_text, normalize_texts
+
+    texts, _ = synthetic_corpus(n_rows)
+    df = pd.DataFrame({
+        'reponse': ["Vente de MAIIS, " + text if i % 4 == 0 else text for i, text in enumerate(texts)],
+        'langage': np.where(np.arange(n_rows) % 3 == 0, 'Anglais', 'Français'),
+    })
+
+    def row_wise():
+        df.apply(lambda row: normalize_text(row['reponse'], row.get('langage', 'auto')), axis=1)
+
+    def column_wise():
+        normalize_texts(df['reponse'], df['langage'])
+
+    normalize_texts(df['reponse'][:10], df['langage'][:10])  # compilation des correcteurs
+    t_rows = _best_time(row_wise, repeat=1)
+    t_column = _best_time(column_wise, repeat=1)
+    print(f"[prepare_data] {n_rows} lignes")
+    print(f"  df.apply(axis=1)  : {t_rows:8.2f} s")
+    print(f"  normalize_texts   : {t_column:8.2f} s  (x{t_rows / t_column:.2f})")
+
+
+def bench_char_ngrams(n_rows=50000, chunk_rows=10000):
+    """Coût des configurations de caractéristiques : débit et mémoire par bloc de 10k lignes"""
+    import tracemalloc
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.pipeline import FeatureUnion
+    from feature_utils import StreamingHashingVectorizer
+
+    texts, _ = synthetic_corpus(n_rows)
+    chunk = texts[:chunk_rows]
+
+    def word_tfidf():
+        return TfidfVectorizer(max_features=10000, ngram_range=(1, 3), min_df=1, max_df=0.95)
+
+    def char_tfidf():
+        return TfidfVectorizer(max_features=20000, ngram_range=(3, 5), analyzer='char_wb',
+                               min_df=2, max_df=0.95, sublinear_tf=True)
+
+    configurations = {
+        'tfidf mots': word_tfidf,
+        'tfidf mots + car.': lambda: FeatureUnion([('words', word_tfidf()), ('chars', char_tfidf())]),
+        'hachage mots': lambda: StreamingHashingVectorizer(n_features=2 ** 16),
+        'hachage mots + car.': lambda: FeatureUnion([
+            ('words', StreamingHashingVectorizer(n_features=2 ** 16)),
+            ('chars', StreamingHashingVectorizer(n_features=2 ** 15, ngram_range=(3, 5), analyzer='char_wb')),
+        ]),
+    }
+
+    print(f"[char_ngrams] ajustement sur {n_rows} lignes, transformation par blocs de {chunk_rows}")
+    print(f"  {'configuration':22s} {'colonnes':>9s} {'transform/10k':>14s} {'lignes/s':>10s} "
+          f"{'matrice/10k':>12s} {'pic/10k':>10s}")
+    for name, factory in configurations.items():
+        vectorizer = factory().fit(texts)
+        t_transform = _best_time(lambda: vectorizer.transform(chunk), repeat=3)
+
+        tracemalloc.start()
+        X = vectorizer.transform(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        matrix_bytes = X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+        print(f"  {name:22s} {X.shape[1]:9d} {t_transform * 1000:11.1f} ms {chunk_rows / t_transform:10.0f} "
+              f"{matrix_bytes / 2 ** 20:9.1f} Mo {peak / 2 ** 20:7.1f} Mo")
+
+
+def bench_data_hash(n_rows=500000):
+    """Empreinte des données : str() du tableau numpy + md5 contre blake2b sur le tampon brut"""
+    import hashlib
+    import pandas as pd
+    from predictor_core import DATA_HASH_COLUMNS, EnhancedHierarchicalPredictor
+
+    texts, labels = synthetic_corpus(n_rows)
+    df = pd.DataFrame({'reponse': texts, 'Classe': labels, 'Grand poste': labels,
+                       'Section': labels, 'Groupe': labels})
+    modified = df.copy()
+    modified.loc[n_rows // 2, 'reponse'] = 'ligne modifiée'
+
+    def string_digest(data):
+        values = pd.util.hash_pandas_object(data[DATA_HASH_COLUMNS], index=True).values
+        return hashlib.md5(str(values).encode()).hexdigest()[:8]
+
+    predictor = EnhancedHierarchicalPredictor()
+    t_string = _best_time(lambda: string_digest(df))
+    t_buffer = _best_time(lambda: predictor.get_data_hash(df))
+    print(f"[data_hash] {n_rows} lignes, une ligne modifiée au milieu")
+    print(f"  str() + md5[:8]      : {t_string * 1000:8.1f} ms  collision: {string_digest(df) == string_digest(modified)}")
+    print(f"  blake2b sur tampon   : {t_buffer * 1000:8.1f} ms  collision: "
+          f"{predictor.get_data_hash(df) == predictor.get_data_hash(modified)}")
+
+
+def bench_hierarchy_options(n_rows=200000):
+    """Options des sélecteurs hiérarchiques : filtrage du DataFrame contre index compact"""
+    import pandas as pd
+    from hierarchy_utils import HIERARCHY_LEVELS, HierarchyIndex
+
+    rng = np.random.default_rng(0)
+    classes = rng.integers(0, 2000, size=n_rows)
+    df = pd.DataFrame({
+        'Grand poste': (classes // 400).astype(str),
+        'Section': (classes // 100).astype(str),
+        'Groupe': (classes // 20).astype(str),
+        'Classe': classes.astype(str),
+    })
+    selections = {'Grand poste': '2', 'Section': '9', 'Groupe': '45'}
+
+    def filter_options():
+        options = {}
+        for i, level in enumerate(HIERARCHY_LEVELS):
+            mask = np.ones(len(df), dtype=bool)
+            for parent in HIERARCHY_LEVELS[:i]:
+                mask &= (df[parent] == selections[parent]).to_numpy()
+            options[level] = sorted(df.loc[mask, level].unique())
+        return options
+
+    t_build = _best_time(lambda: HierarchyIndex(df[HIERARCHY_LEVELS].drop_duplicates().itertuples(index=False)),
+                         repeat=3)
+    index = HierarchyIndex(df[HIERARCHY_LEVELS].drop_duplicates().itertuples(index=False))
+    t_filter = _best_time(filter_options)
+    t_index = _best_time(lambda: {level: index.options(level, selections) for level in HIERARCHY_LEVELS})
+    print(f"[hierarchy_options] {n_rows} lignes, {index.size('Classe')} classes, 4 sélecteurs")
+    print(f"  filtrage DataFrame   : {t_filter * 1000:8.2f} ms")
+    print(f"  index (requêtes)     : {t_index * 1000:8.2f} ms  (construction unique : {t_build * 1000:.1f} ms)")
+    print(f"  résultats identiques : {filter_options() == {level: index.options(level, selections) for level in HIERARCHY_LEVELS}}")
+
+
+def bench_model_load(n_rows=20000, feature_backend='hashing'):
+    """Chargement à froid d'un modèle : fichier pickle contre dossier d'artefact projeté en mémoire"""
+    import logging
+    import os
+    import pandas as pd
+    import tempfile
+    from predictor_core import EnhancedHierarchicalPredictor
+
+    logging.getLogger('predictor_core').setLevel(logging.WARNING)
+    texts, labels = synthetic_corpus(n_rows)
+    df = pd.DataFrame({
+        'reponse': texts, 'langage': 'Français',
+        'Grand poste': labels // 50, 'Section': labels // 20, 'Groupe': labels // 5, 'Classe': labels,
+    })
+
+    with tempfile.TemporaryDirectory() as directory:
+        predictor = EnhancedHierarchicalPredictor(feature_backend=feature_backend)
+        predictor.models_directory = directory
+        predictor.cache_directory = os.path.join(directory, 'cache')
+        predictor.train_hierarchical_models(predictor.prepare_data(df, 'Classe'), 'Classe')
+
+        artifact_path = os.path.join(directory, 'artifact')
+        pickle_path = os.path.join(directory, 'model.pkl')
+        predictor.save_models(artifact_path)
+        predictor.save_pickle(pickle_path)
+
+        t_pickle = _best_time(lambda: EnhancedHierarchicalPredictor().load_models(pickle_path, allow_pickle=True))
+        t_artifact = _best_time(lambda: EnhancedHierarchicalPredictor().load_models(artifact_path))
+        artifact_size = sum(entry.stat().st_size for entry in os.scandir(artifact_path))
+        print(f"[model_load] {n_rows} lignes, moteur {feature_backend}, {len(np.unique(labels))} classes")
+        print(f"  pickle.load          : {t_pickle * 1000:8.1f} ms  ({os.path.getsize(pickle_path) / 1e6:.1f} Mo)")
+        print(f"  artefact (mmap)      : {t_artifact * 1000:8.1f} ms  ({artifact_size / 1e6:.1f} Mo)")
+
+
+BENCHMARKS = {
+    'single_pass': bench_single_pass,
+    'prepare_data': bench_prepare_data,
+    'char_ngrams': bench_char_ngrams,
+    'data_hash': bench_data_hash,
+    'hierarchy_options': bench_hierarchy_options,
+    'model_load': bench_model_load,
+}
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        BENCHMARKS[name]()
@@ -0,0 +1,250 @@
+"""
+Classification par lot en ligne de commande, sans interface Streamlit.
+
+Charge un modèle sauvegardé dans saved_models/, lit le fichier d'entrée par
+blocs (CSV, Excel ou TXT), répartit les blocs entre plusieurs processus et
+écrit les prédictions au fil de l'eau en CSV ou en Parquet. Les textes vides
+sont ignorés ; la colonne 'ligne' (numéro de la ligne de données dans le
+fichier d'entrée, à partir de 1) permet de rattacher chaque prédiction à sa source.
+
+Usage :
+    python classify_cli.py reponses.csv -o predictions.csv --text-column reponse
+    python classify_cli.py reponses.xlsx -o predictions.parquet --workers 4 --joint
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_utils import BatchTextReader
+from hierarchy_utils import HIERARCHY_LEVELS
+from model_artifacts import is_artifact
+from model_registry import ModelRegistry
+from predictor_core import EnhancedHierarchicalPredictor
+
+logger = logging.getLogger("classify_cli")
+
+# Prédicteur chargé une fois par processus de travail
+_worker_predictor = None
+
+
+# ----------------------------------------------------------------
+# MODÈLE
+# ----------------------------------------------------------------
+
+def find_latest_model(models_directory, prediction_level, allow_pickle=False):
+    """Modèle le plus récent d'un niveau dans le dossier des modèles (None si aucun)"""
+    pattern = os.path.join(models_directory, f"enhanced_predictor_{prediction_level}_*")
+    candidates = [
+        path for path in glob.glob(pattern)
+        if is_artifact(path) or (allow_pickle and path.endswith('.pkl'))
+    ]
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def find_model(models_directory, prediction_level, allow_pickle=False):
+    """Version active du registre pour un niveau, sinon le modèle le plus récent (None si aucun)"""
+    return (ModelRegistry(models_directory).active_path(prediction_level)
+            or find_latest_model(models_directory, prediction_level, allow_pickle))
+
+
+def load_predictor(model_path, allow_pickle=False, verify=False):
+    """Charge un prédicteur depuis un modèle sauvegardé (None en cas d'échec)"""
+    predictor = EnhancedHierarchicalPredictor()
+    return predictor if predictor.load_models(model_path, allow_pickle, verify) else None
+
+
+def finest_level(predictor):
+    """Niveau le plus fin pour lequel le modèle a été entraîné"""
+    trained = [level for level in HIERARCHY_LEVELS if level in predictor.best_models]
+    return trained[-1] if trained else None
+
+
+# ----------------------------------------------------------------
+# PRÉDICTION (PROCESSUS DE TRAVAIL)
+# ----------------------------------------------------------------
+
+def _init_worker(model_path, allow_pickle):
+    global _worker_predictor
+    logging.getLogger("predictor_core").setLevel(logging.WARNING)
+    _worker_predictor = load_predictor(model_path, allow_pickle)
+    if _worker_predictor is None:
+        raise RuntimeError(f"Impossible de charger le modèle {model_path}")
+
+
+def _predict_chunk(row_numbers, texts, prediction_level, joint):
+    """Prédit un bloc ; retourne le tableau de résultats, la durée et le nombre de lignes évaluées"""
+    start = time.perf_counter()
+    predictions, stats = _worker_predictor.predict_hierarchy_batch(
+        texts, prediction_level, joint=joint, return_stats=True
+    )
+    predictions.insert(0, 'ligne', row_numbers)
+    predictions.insert(1, 'texte', texts)
+    return predictions, time.perf_counter() - start, stats['rows_scored']
+
+
+# ----------------------------------------------------------------
+# SORTIE
+# ----------------------------------------------------------------
+
+class PredictionWriter:
+    """Écriture incrémentale des prédictions en CSV ou en Parquet (selon l'extension)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows_written = 0
+        self.format = 'parquet' if path.endswith('.parquet') else 'csv'
+        self._writer = None
+
+        if self.format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError("La sortie Parquet nécessite pyarrow (pip install pyarrow)")
+
+    def write(self, df):
+        if self.format == 'csv':
+            df.to_csv(self.path, mode='w' if self.rows_written == 0 else 'a',
+                      header=self.rows_written == 0, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        self.rows_written += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# ----------------------------------------------------------------
+# TRAITEMENT
+# ----------------------------------------------------------------
+
+def classify_file(model_path, input_path, output_path, text_column=None, prediction_level=None,
+                  chunk_size=5000, workers=1, joint=False, allow_pickle=False, verify=False):
+    """
+    Classifie un fichier bloc par bloc et écrit les prédictions au fur et à mesure.
+
+    Les blocs sont répartis entre `workers` processus (chacun charge le modèle une
+    fois) ; au plus deux blocs par processus sont en cours, et les résultats sont
+    écrits dans l'ordre du fichier d'entrée. Le modèle est validé (et, avec
+    verify, contrôlé fichier par fichier) avant la lecture de l'entrée.
+
+    Returns:
+        dict: lignes traitées, durée totale, débit et latences par bloc
+    """
+    predictor = load_predictor(model_path, allow_pickle, verify)
+    if predictor is None:
+        raise ValueError(f"Impossible de charger le modèle {model_path}")
+    prediction_level = prediction_level or finest_level(predictor)
+    if prediction_level is None:
+        raise ValueError("Le modèle ne contient aucun niveau entraîné")
+
+    reader = BatchTextReader(input_path, text_column, chunk_size)
+    if reader.text_column not in reader.columns():
+        raise ValueError(f"Colonne '{reader.text_column}' introuvable")
+
+    writer = PredictionWriter(output_path)
+    latencies = []
+    rows_scored = []
+    start = time.perf_counter()
+
+    def collect(result):
+        predictions, latency, scored = result
+        writer.write(predictions)
+        latencies.append(latency)
+        rows_scored.append(scored)
+        logger.info("%d lignes traitées (%.0f%%)", writer.rows_written, 100 * reader.progress)
+
+    try:
+        if workers <= 1:
+            global _worker_predictor
+            _worker_predictor = predictor
+            for row_numbers, texts in reader.iter_rows():
+                collect(_predict_chunk(row_numbers, texts, prediction_level, joint))
+        else:
+            del predictor
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(model_path, allow_pickle)) as executor:
+                pending = deque()
+                for row_numbers, texts in reader.iter_rows():
+                    pending.append(executor.submit(_predict_chunk, row_numbers, texts, prediction_level, joint))
+                    if len(pending) >= 2 * workers:
+                        collect(pending.popleft().result())
+                while pending:
+                    collect(pending.popleft().result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': writer.rows_written,
+        'chunks': len(latencies),
+        'seconds': elapsed,
+        'rows_per_second': writer.rows_written / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000) if latencies else 0.0,
+        'p99_ms': float(np.percentile(latencies, 99) * 1000) if latencies else 0.0,
+        'cache_hit_rate': 1 - sum(rows_scored) / writer.rows_written if writer.rows_written else 0.0,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Classification hiérarchique par lot (sans interface)")
+    parser.add_argument("input", help="fichier d'entrée (.csv, .xlsx, .xls ou .txt)")
+    parser.add_argument("-o", "--output", required=True, help="fichier de sortie (.csv ou .parquet)")
+    parser.add_argument("--text-column", default="reponse", help="colonne des textes (ignorée pour .txt)")
+    parser.add_argument("--model", help="modèle à utiliser (par défaut : version active du registre, "
+                                        "sinon le plus récent du niveau)")
+    parser.add_argument("--models-dir", default="saved_models", help="dossier des modèles sauvegardés")
+    parser.add_argument("--level", choices=HIERARCHY_LEVELS,
+                        help="niveau de prédiction (par défaut : le plus fin du modèle)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="textes par bloc")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processus de prédiction")
+    parser.add_argument("--joint", action="store_true", help="décodage hiérarchique cohérent")
+    parser.add_argument("--verify", action="store_true", help="contrôle l'empreinte de chaque fichier du modèle")
+    parser.add_argument("--allow-pickle", action="store_true",
+                        help="accepte les anciens modèles .pkl (exécutent du code : fichiers de confiance uniquement)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="n'afficher que le résumé")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(message)s")
+
+    model_path = args.model or find_model(args.models_dir, args.level or 'Classe', args.allow_pickle)
+    if model_path is None:
+        logger.error("Aucun modèle trouvé dans %s", args.models_dir)
+        return 1
+
+    try:
+        summary = classify_file(
+            model_path, args.input, args.output, args.text_column, args.level,
+            chunk_size=args.chunk_size, workers=max(1, args.workers), joint=args.joint,
+            allow_pickle=args.allow_pickle, verify=args.verify
+        )
+    except (ValueError, OSError, RuntimeError) as e:
+        logger.error("Erreur: %s", e)
+        return 1
+
+    print(f"{summary['rows']} lignes en {summary['seconds']:.2f} s "
+          f"({summary['rows_per_second']:.0f} lignes/s, {summary['chunks']} blocs)")
+    print(f"Latence par bloc : p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms")
+    print(f"Lignes servies sans recalcul (doublons, cache) : {summary['cache_hit_rate']:.1%}")
+    print(f"Prédictions écrites dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,84 +1,252 @@
 import pandas as pd
+from openpyxl.formatting.rule import Rule
 from openpyxl.styles import PatternFill
+from openpyxl.styles.differential import DifferentialStyle
+from openpyxl.styles.numbers import NumberFormat
 from openpyxl.utils import get_column_letter
 from datetime import datetime
 import os
+import tempfile
+import time
+
+# Seuils et couleurs de la mise en forme des colonnes de confiance
+HIGH_CONFIDENCE = 0.8
+MEDIUM_CONFIDENCE = 0.6
+HIGH_COLOR = 'FF28A745'
+MEDIUM_COLOR = 'FFFFC107'
+LOW_COLOR = 'FFFF6B6B'
+
+# Format pourcentage intégré d'Excel (numFmtId 10), porté par les règles conditionnelles
+PERCENT_FORMAT = NumberFormat(numFmtId=10, formatCode='0.00%')
+
+MAX_COLUMN_WIDTH = 80
+
+# Dossier dédié aux exports par lot ; un export plus ancien est supprimé au démarrage
+# d'un nouvel export (sessions fermées sans nouvel export)
+EXPORT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'predictions_exports')
+EXPORT_MAX_AGE_HOURS = 24
+
+
+def is_confidence_column(column):
+    """Indique si une colonne contient des scores de confiance"""
+    column = str(column).lower()
+    return 'confiance' in column or 'probabilité' in column
+
+
+def confidence_values(series):
+    """Convertit une colonne de confiances ('12.34%' ou numériques) en nombres entre 0 et 1"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    text = series.astype(str).str.strip()
+    values = pd.to_numeric(text.str.rstrip('%'), errors='coerce')
+    return values.where(~text.str.endswith('%'), values / 100.0)
+
+
+def numeric_confidences(df):
+    """Copie du DataFrame dont les colonnes de confiance sont numériques"""
+    columns = [col for col in df.columns if is_confidence_column(col)]
+    if not columns:
+        return df
+    return df.assign(**{col: confidence_values(df[col]) for col in columns})
+
+
+def column_widths(df):
+    """Largeur de chaque colonne Excel calculée sur le DataFrame (en-tête compris)"""
+    widths = {}
+    for idx, col in enumerate(df.columns, start=1):
+        values_length = df[col].astype(str).str.len().fillna(0).max() if len(df) else 0
+        max_length = max(len(str(col)), int(values_length))
+        widths[get_column_letter(idx)] = min(max_length + 2, MAX_COLUMN_WIDTH)
+    return widths
+
+
+def confidence_rules(column_letter):
+    """Règles conditionnelles (élevée, moyenne, faible) d'une colonne de confiance"""
+    def style(color):
+        fill = PatternFill(start_color=color, end_color=color, fill_type='solid')
+        return DifferentialStyle(fill=fill, numFmt=PERCENT_FORMAT)
+
+    first_cell = f'{column_letter}2'
+    return [
+        Rule(type='cellIs', operator='greaterThan', formula=[str(HIGH_CONFIDENCE)],
+             dxf=style(HIGH_COLOR), stopIfTrue=True),
+        Rule(type='cellIs', operator='greaterThan', formula=[str(MEDIUM_CONFIDENCE)],
+             dxf=style(MEDIUM_COLOR), stopIfTrue=True),
+        # Les cellules vides ou non numériques ne sont pas colorées
+        Rule(type='expression', formula=[f'AND(ISNUMBER({first_cell}),{first_cell}<={MEDIUM_CONFIDENCE})'],
+             dxf=style(LOW_COLOR), stopIfTrue=True),
+    ]
+
+
+def format_worksheet(worksheet, columns, n_rows, widths=None):
+    """
+    Applique la mise en forme d'un export : largeurs de colonnes et une mise en
+    forme conditionnelle native par colonne de confiance. Le coût ne dépend pas
+    du nombre de lignes (aucune cellule n'est parcourue).
+
+    Args:
+        worksheet: feuille openpyxl (classique ou write_only)
+        columns (list): noms des colonnes, dans l'ordre de la feuille
+        n_rows (int): nombre de lignes de données (hors en-tête)
+        widths (dict, optional): largeurs par lettre de colonne
+    """
+    for column_letter, width in (widths or {}).items():
+        worksheet.column_dimensions[column_letter].width = width
+
+    if n_rows == 0:
+        return
+    for idx, col in enumerate(columns, start=1):
+        if is_confidence_column(col):
+            column_letter = get_column_letter(idx)
+            cell_range = f'{column_letter}2:{column_letter}{n_rows + 1}'
+            for rule in confidence_rules(column_letter):
+                worksheet.conditional_formatting.add(cell_range, rule)
+
 
 def export_to_excel(predictions_data, output_path):
     """
     Exporte les prédictions vers un fichier Excel avec mise en forme conditionnelle.
-    
+
     Args:
         predictions_data (list): Liste de dictionnaires contenant les prédictions
         output_path (str): Chemin où sauvegarder le fichier Excel
     """
     try:
-        # Créer un DataFrame avec les prédictions
-        df = pd.DataFrame(predictions_data)
-        
+        # Créer un DataFrame avec les prédictions (confiances numériques)
+        df = numeric_confidences(pd.DataFrame(predictions_data))
+
         # Créer le nom du fichier avec horodatage
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"predictions_{timestamp}.xlsx"
         full_path = os.path.join(output_path, filename)
-        
+
         # Assurer que le dossier existe
         os.makedirs(output_path, exist_ok=True)
-        
-        # Exporter vers Excel
-        df.to_excel(full_path, index=False, engine='openpyxl')
-        
-        # Appliquer la mise en forme conditionnelle
-        from openpyxl import load_workbook
-        wb = load_workbook(full_path)
-        ws = wb.active
-        
-        # Définir les couleurs pour la mise en forme conditionnelle
-        green_fill = PatternFill(start_color='90EE90', end_color='90EE90', fill_type='solid')
-        yellow_fill = PatternFill(start_color='FFD700', end_color='FFD700', fill_type='solid')
-        red_fill = PatternFill(start_color='FF6B6B', end_color='FF6B6B', fill_type='solid')
-        
-        # Trouver la colonne de confiance
-        confidence_col = None
-        for col in range(1, ws.max_column + 1):
-            if ws.cell(row=1, column=col).value == 'Confiance':
-                confidence_col = col
-                break
-        
-        if confidence_col:
-            for row in range(2, ws.max_row + 1):
-                cell = ws.cell(row=row, column=confidence_col)
-                try:
-                    # Convertir la valeur de confiance en nombre
-                    confidence = float(str(cell.value).strip('%')) / 100
-                    
-                    # Appliquer la couleur selon le niveau de confiance
-                    if confidence > 0.8:
-                        cell.fill = green_fill
-                    elif confidence > 0.6:
-                        cell.fill = yellow_fill
-                    else:
-                        cell.fill = red_fill
-                except (ValueError, TypeError):
-                    continue
-        
-        # Ajuster la largeur des colonnes
-        for col in range(1, ws.max_column + 1):
-            max_length = 0
-            column = get_column_letter(col)
-            
-            for cell in ws[column]:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            
-            adjusted_width = (max_length + 2)
-            ws.column_dimensions[column].width = adjusted_width
-        
-        # Sauvegarder le fichier avec la mise en forme
-        wb.save(full_path)
+
+        # Écriture et mise en forme en une seule sauvegarde
+        with pd.ExcelWriter(full_path, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False, sheet_name='Prédictions')
+            format_worksheet(writer.sheets['Prédictions'], df.columns, len(df), column_widths(df))
+
         return filename
-        
+
     except Exception as e:
-        raise Exception(f"Erreur lors de l'exportation Excel: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Erreur lors de l'exportation Excel: {str(e)}")
+
+
+def cleanup_exports(directory=EXPORT_DIRECTORY, max_age_hours=EXPORT_MAX_AGE_HOURS):
+    """Supprime les fichiers d'export plus anciens que max_age_hours ; renvoie leur nombre"""
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.name.startswith('predictions_') and entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            # Fichier déjà supprimé par une autre session
+            pass
+    return removed
+
+
+class StreamingExportWriter:
+    """
+    Écriture incrémentale des résultats de prédiction dans un fichier temporaire.
+
+    Chaque bloc de résultats est écrit dès qu'il est produit : ajout en fin de
+    fichier pour le CSV, mode write_only d'openpyxl pour Excel. Les confiances
+    sont écrites en nombres ; leur couleur et leur format pourcentage viennent
+    d'une mise en forme conditionnelle ajoutée à la fermeture. Aucun DataFrame
+    complet n'est conservé en mémoire.
+
+    Les fichiers sont créés dans un dossier dédié ; à chaque nouvel export, ceux de
+    plus de max_age_hours (sessions fermées) y sont supprimés.
+
+    Args:
+        file_format (str): 'xlsx' ou 'csv'
+        columns (list, optional): colonnes à exporter (toutes si None)
+        metadata (dict, optional): informations ajoutées en colonne et dans une feuille dédiée
+        directory (str, optional): dossier des exports (par défaut EXPORT_DIRECTORY)
+        max_age_hours (float): âge au-delà duquel un ancien export est supprimé
+    """
+
+    def __init__(self, file_format='xlsx', columns=None, metadata=None, directory=None,
+                 max_age_hours=EXPORT_MAX_AGE_HOURS):
+        if file_format not in ('xlsx', 'csv'):
+            raise ValueError(f"Format d'export non supporté: {file_format}")
+
+        directory = directory or EXPORT_DIRECTORY
+        os.makedirs(directory, exist_ok=True)
+        cleanup_exports(directory, max_age_hours)
+
+        self.file_format = file_format
+        self.columns = columns
+        self.metadata = metadata or {}
+        self.rows_written = 0
+        self._header = None
+
+        handle, self.path = tempfile.mkstemp(prefix='predictions_', suffix=f'.{file_format}', dir=directory)
+        os.close(handle)
+
+        if file_format == 'csv':
+            self._handle = open(self.path, 'w', encoding='utf-8', newline='')
+        else:
+            from openpyxl import Workbook
+            self._workbook = Workbook(write_only=True)
+            self._worksheet = self._workbook.create_sheet('Prédictions')
+
+    def _prepare(self, df):
+        """Sélection des colonnes et ajout des métadonnées à un bloc"""
+        if self.columns is not None:
+            df = df[[col for col in self.columns if col in df.columns]]
+        if self.metadata:
+            df = df.assign(**self.metadata)
+        return df
+
+    def write(self, df):
+        """Ajoute un bloc de résultats au fichier"""
+        df = self._prepare(df)
+
+        if self.file_format == 'csv':
+            df.to_csv(self._handle, index=False, header=self.rows_written == 0)
+        else:
+            df = numeric_confidences(df)
+            if self._header is None:
+                # En mode write_only, les largeurs doivent être fixées avant la
+                # première ligne : elles sont calculées sur le premier bloc
+                self._header = list(df.columns)
+                format_worksheet(self._worksheet, self._header, 0, column_widths(df))
+                self._worksheet.append(self._header)
+            for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+                self._worksheet.append(row)
+
+        self.rows_written += len(df)
+
+    def close(self):
+        """Termine le fichier et renvoie son chemin"""
+        if self.file_format == 'csv':
+            self._handle.close()
+        else:
+            if self._header is None:
+                self._header = list(self.columns or []) + list(self.metadata)
+                self._worksheet.append(self._header)
+            format_worksheet(self._worksheet, self._header, self.rows_written)
+            if self.metadata:
+                metadata_sheet = self._workbook.create_sheet('Métadonnées')
+                metadata_sheet.append(list(self.metadata))
+                metadata_sheet.append(list(self.metadata.values()))
+            self._workbook.save(self.path)
+        return self.path
+
+    def discard(self):
+        """Ferme et supprime le fichier temporaire (export interrompu)"""
+        try:
+            if self.file_format == 'csv':
+                self._handle.close()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
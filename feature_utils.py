@@ -0,0 +1,78 @@
+from itertools import islice
+
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+
+def iter_chunks(texts, chunk_size):
+    """Découpe un itérable de textes en listes de taille chunk_size"""
+    iterator = iter(texts)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class StreamingHashingVectorizer(TransformerMixin, BaseEstimator):
+    """
+    Vectoriseur sans vocabulaire : n-grammes (de mots ou de caractères) hachés dans
+    un espace de taille fixe, avec repondération IDF optionnelle.
+
+    L'ajustement ne conserve que les fréquences documentaires (un vecteur de taille
+    n_features) et parcourt le corpus par blocs : la mémoire reste constante quelle
+    que soit la taille du fichier d'entraînement. Les valeurs restent positives
+    (alternate_sign=False), comme l'exige MultinomialNB.
+    """
+
+    def __init__(self, n_features=2 ** 16, ngram_range=(1, 3), analyzer='word', use_idf=True,
+                 chunk_size=10000):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.analyzer = analyzer
+        self.use_idf = use_idf
+        self.chunk_size = chunk_size
+
+    def _hasher(self):
+        return HashingVectorizer(
+            n_features=self.n_features,
+            ngram_range=self.ngram_range,
+            lowercase=True,
+            analyzer=self.analyzer,
+            alternate_sign=False,
+            norm=None
+        )
+
+    def fit(self, texts, y=None):
+        """Calcule l'IDF par blocs de textes (itérable quelconque, éventuellement un générateur)"""
+        hasher = self._hasher()
+        document_frequency = np.zeros(self.n_features, dtype=np.int64)
+        n_documents = 0
+
+        for chunk in iter_chunks(texts, self.chunk_size):
+            counts = hasher.transform(chunk).tocsr()
+            counts.sum_duplicates()
+            document_frequency += np.bincount(counts.indices, minlength=self.n_features)
+            n_documents += counts.shape[0]
+
+        # Même lissage que TfidfTransformer(smooth_idf=True)
+        self.n_documents_ = n_documents
+        if self.use_idf:
+            self.idf_ = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+        return self
+
+    def transform(self, texts):
+        """Matrice creuse TF-IDF (normalisée L2) des textes"""
+        X = self._hasher().transform(texts)
+        if self.use_idf:
+            X = X @ sparse.diags(self.idf_)
+        return normalize(X.tocsr(), norm='l2', copy=False)
+
+    def fit_transform(self, texts, y=None):
+        """Ajustement puis transformation ; un itérateur à usage unique est d'abord matérialisé"""
+        if iter(texts) is texts:
+            texts = list(texts)
+        return self.fit(texts).transform(texts)
@@ -0,0 +1,33 @@
+import json
+import os
+import tempfile
+
+
+def atomic_write(path, write, mode='wb', encoding=None):
+    """
+    Écriture atomique d'un fichier : `write(f)` remplit un fichier temporaire unique
+    du même dossier, qui remplace ensuite la cible par renommage. Un lecteur ne voit
+    jamais de fichier partiel, et des écritures concurrentes (threads, processus) ne
+    partagent jamais le même fichier temporaire.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(mode, encoding=encoding, dir=directory, delete=False,
+                                     prefix=f".{os.path.basename(path)}.", suffix='.tmp') as f:
+        tmp_filename = f.name
+        try:
+            write(f)
+        except BaseException:
+            f.close()
+            os.remove(tmp_filename)
+            raise
+    try:
+        os.replace(tmp_filename, path)
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+
+
+def atomic_write_json(path, data, indent=2):
+    """Écriture atomique d'un document JSON (UTF-8)"""
+    atomic_write(path, lambda f: json.dump(data, f, ensure_ascii=False, indent=indent),
+                 mode='w', encoding='utf-8')
@@ -0,0 +1,168 @@
+import numpy as np
+
+HIERARCHY_LEVELS = ['Grand poste', 'Section', 'Groupe', 'Classe']
+
+
+def _sort_key(path):
+    return tuple(map(str, path))
+
+
+class HierarchyIndex:
+    """
+    Index compact de la nomenclature, construit une fois à partir des chemins
+    distincts (Grand poste, Section, Groupe, Classe).
+
+    Chaque nœud d'un niveau correspond à un préfixe de chemin distinct et reçoit un
+    identifiant entier. Les nœuds d'un niveau sont triés par parent puis par libellé,
+    si bien que les enfants d'un nœud occupent une plage contiguë du niveau suivant :
+    parents, plages d'enfants et nombre de classes terminales sont des tableaux
+    numpy, et les requêtes se font en temps constant, sans filtrage pandas.
+
+    Args:
+        paths (iterable): chemins complets (tuples d'un libellé par niveau)
+        levels (list): noms des niveaux, du plus général au plus fin
+    """
+
+    def __init__(self, paths, levels=HIERARCHY_LEVELS):
+        self.levels = list(levels)
+        paths = sorted(set(map(tuple, paths)), key=_sort_key)
+
+        self.labels = []        # libellé de chaque nœud, par niveau
+        self.parents = []       # identifiant du nœud parent (-1 au premier niveau)
+        self._lookup = []       # (parent, libellé) -> nœud, par niveau
+
+        previous_ids = [-1] * len(paths)
+        for depth in range(len(self.levels)):
+            node_ids = {}
+            labels, parents = [], []
+            path_ids = []
+            for path, parent in zip(paths, previous_ids):
+                key = (parent, path[depth])
+                node = node_ids.get(key)
+                if node is None:
+                    node = node_ids[key] = len(labels)
+                    labels.append(path[depth])
+                    parents.append(parent)
+                path_ids.append(node)
+            self.labels.append(np.array(labels, dtype=object))
+            self.parents.append(np.array(parents, dtype=np.intp))
+            self._lookup.append(node_ids)
+            previous_ids = path_ids
+
+        # Plage des enfants de chaque nœud dans le niveau suivant (parents triés)
+        self.child_offsets = [
+            np.searchsorted(self.parents[depth + 1], np.arange(len(self.labels[depth]) + 1))
+            for depth in range(len(self.levels) - 1)
+        ]
+
+        # Nombre de classes terminales sous chaque nœud
+        self.leaf_counts = [None] * len(self.levels)
+        if self.levels:
+            self.leaf_counts[-1] = np.ones(len(self.labels[-1]), dtype=np.intp)
+            for depth in range(len(self.levels) - 2, -1, -1):
+                self.leaf_counts[depth] = np.bincount(
+                    self.parents[depth + 1], weights=self.leaf_counts[depth + 1],
+                    minlength=len(self.labels[depth])
+                ).astype(np.intp)
+
+    @classmethod
+    def from_structure(cls, structure, levels=HIERARCHY_LEVELS):
+        """Construit l'index à partir de la structure imbriquée {libellé: {enfants}}"""
+        paths = []
+
+        def collect(node, prefix):
+            if len(prefix) == len(levels):
+                paths.append(tuple(prefix))
+                return
+            for value, children in node.items():
+                collect(children, prefix + [value])
+
+        collect(structure, [])
+        return cls(paths, levels)
+
+    # ----------------------------------------------------------------
+    # REQUÊTES
+    # ----------------------------------------------------------------
+
+    def depth(self, level):
+        return self.levels.index(level)
+
+    def size(self, level):
+        """Nombre de nœuds d'un niveau"""
+        return len(self.labels[self.depth(level)])
+
+    def distinct_labels(self, level):
+        """Nombre de libellés distincts d'un niveau (un libellé peut avoir plusieurs parents)"""
+        return len(set(self.labels[self.depth(level)]))
+
+    def node(self, level, label, parent=-1):
+        """Identifiant du nœud (parent, libellé) d'un niveau, None s'il n'existe pas"""
+        return self._lookup[self.depth(level)].get((parent, label))
+
+    def children(self, level, node):
+        """Identifiants (dans le niveau suivant) des enfants d'un nœud"""
+        offsets = self.child_offsets[self.depth(level)]
+        return np.arange(offsets[node], offsets[node + 1])
+
+    def ancestors(self, level, node):
+        """Chemin {niveau: libellé} du premier niveau jusqu'au nœud inclus"""
+        path = {}
+        for depth in range(self.depth(level), -1, -1):
+            path[self.levels[depth]] = self.labels[depth][node]
+            node = self.parents[depth][node]
+        return dict(reversed(list(path.items())))
+
+    def leaf_count(self, level, node):
+        """Nombre de classes terminales sous un nœud"""
+        return int(self.leaf_counts[self.depth(level)][node])
+
+    def find(self, selections):
+        """
+        Nœud le plus profond désigné par des sélections consécutives depuis le premier niveau.
+
+        Returns:
+            tuple: (profondeur, nœud), (-1, -1) sans sélection, None si une sélection est inconnue
+        """
+        depth, node = -1, -1
+        for level in self.levels:
+            value = selections.get(level)
+            if not value:
+                break
+            node = self.node(level, value, node)
+            if node is None:
+                return None
+            depth += 1
+        return depth, node
+
+    def descendants(self, level, selections):
+        """Identifiants des nœuds d'un niveau compatibles avec les sélections des niveaux parents"""
+        target = self.depth(level)
+        found = self.find({lvl: selections.get(lvl) for lvl in self.levels[:target]})
+        if found is None:
+            return np.array([], dtype=np.intp)
+
+        depth, node = found
+        if depth < 0:
+            return np.arange(len(self.labels[target]))
+        start, end = node, node + 1
+        for d in range(depth, target):
+            start, end = self.child_offsets[d][start], self.child_offsets[d][end]
+        return np.arange(start, end)
+
+    def options(self, level, selections):
+        """Libellés distincts proposés pour un niveau, triés, selon les sélections parentes"""
+        nodes = self.descendants(level, selections)
+        labels = self.labels[self.depth(level)][nodes]
+        return sorted(set(labels), key=str)
+
+    def path_labels(self, level):
+        """Matrice (nœuds du niveau x niveaux jusqu'à lui) des libellés de chaque chemin"""
+        target = self.depth(level)
+        nodes = np.arange(len(self.labels[target]))
+        columns = [None] * (target + 1)
+        for depth in range(target, -1, -1):
+            columns[depth] = self.labels[depth][nodes]
+            nodes = self.parents[depth][nodes]
+        if not columns[0].size:
+            return np.empty((0, target + 1), dtype=object)
+        return np.column_stack(columns)
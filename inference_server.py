@@ -0,0 +1,437 @@
+"""
+Service HTTP local de classification, sans dépendance hors bibliothèque standard.
+
+Le prédicteur est chargé une seule fois. Les requêtes concurrentes sont
+regroupées en micro-lots (taille maximale et attente maximale configurables)
+puis classées en une seule passe vectorisée (predict_hierarchy_batch).
+
+Points d'accès :
+    POST /predict  {"text": "..."} ou {"texts": ["...", ...]}, options "level" et "joint"
+    GET  /health   état du service et modèle chargé
+    GET  /metrics  compteurs de latence et de débit
+
+Sans --model, le service suit la version active du registre des modèles
+(model_registry.py) : une promotion ou un retour arrière est pris en compte à
+chaud, sans redémarrage ni interruption des requêtes en cours.
+
+Usage :
+    python inference_server.py --port 8000 --max-wait-ms 10
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from classify_cli import find_model, finest_level, load_predictor
+from hierarchy_utils import HIERARCHY_LEVELS
+from model_artifacts import MANIFEST_FILENAME, is_artifact, read_manifest
+from model_registry import ModelRegistry
+
+logger = logging.getLogger("inference_server")
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+
+# ----------------------------------------------------------------
+# COMPTEURS
+# ----------------------------------------------------------------
+
+class ServiceStats:
+    """Compteurs du service (thread-safe) : requêtes, textes, lots, latences récentes"""
+
+    def __init__(self, window=1000):
+        self.started = time.time()
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.errors = 0
+        self.request_latencies = deque(maxlen=window)
+        self.batch_latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_batch(self, n_texts, seconds):
+        with self._lock:
+            self.batches += 1
+            self.batch_sizes.append(n_texts)
+            self.batch_latencies.append(seconds)
+
+    def record_request(self, n_texts, seconds, error=False):
+        with self._lock:
+            self.requests += 1
+            self.texts += n_texts
+            self.errors += int(error)
+            self.request_latencies.append(seconds)
+
+    def snapshot(self):
+        """Vue instantanée des compteurs (latences en millisecondes)"""
+        def percentile(values, q):
+            return float(np.percentile(values, q) * 1000) if values else 0.0
+
+        with self._lock:
+            uptime = time.time() - self.started
+            request_latencies = list(self.request_latencies)
+            batch_latencies = list(self.batch_latencies)
+            batch_sizes = list(self.batch_sizes)
+            return {
+                'uptime_seconds': uptime,
+                'requests': self.requests,
+                'texts': self.texts,
+                'errors': self.errors,
+                'batches': self.batches,
+                'mean_batch_size': float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+                'texts_per_second': self.texts / uptime if uptime > 0 else 0.0,
+                'request_latency_ms': {
+                    'p50': percentile(request_latencies, 50),
+                    'p99': percentile(request_latencies, 99),
+                },
+                'batch_latency_ms': {
+                    'p50': percentile(batch_latencies, 50),
+                    'p99': percentile(batch_latencies, 99),
+                },
+            }
+
+
+# ----------------------------------------------------------------
+# MICRO-LOTS
+# ----------------------------------------------------------------
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes concurrentes en micro-lots traités par un seul thread.
+
+    Un lot est fermé dès qu'il atteint max_batch_size textes, ou max_wait secondes
+    après l'arrivée de sa première requête. Les requêtes d'un lot sont regroupées
+    par (niveau, décodage conjoint) et chaque groupe est prédit en une passe.
+
+    Args:
+        predict (callable): fonction (textes, niveau, joint) -> DataFrame d'une ligne par texte
+        max_batch_size (int): nombre maximal de textes par lot
+        max_wait (float): attente maximale en secondes pour compléter un lot
+        stats (ServiceStats, optional): compteurs à alimenter
+    """
+
+    def __init__(self, predict, max_batch_size=512, max_wait=0.01, stats=None):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = stats or ServiceStats()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts, prediction_level='Classe', joint=False):
+        """Ajoute des textes à la file ; le Future reçoit la liste des prédictions"""
+        future = Future()
+        self._queue.put((list(texts), (prediction_level, joint), future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            size = len(first[0])
+            deadline = time.perf_counter() + self.max_wait
+            stop = False
+            while size < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch):
+        groups = {}
+        for texts, key, future in batch:
+            groups.setdefault(key, []).append((texts, future))
+
+        for (prediction_level, joint), items in groups.items():
+            texts = [text for item_texts, _ in items for text in item_texts]
+            start = time.perf_counter()
+            try:
+                records = self.predict(texts, prediction_level, joint).to_dict('records')
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            self.stats.record_batch(len(texts), time.perf_counter() - start)
+
+            # Redistribution des résultats aux requêtes d'origine
+            offset = 0
+            for item_texts, future in items:
+                future.set_result(records[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+# ----------------------------------------------------------------
+# HTTP
+# ----------------------------------------------------------------
+
+def _json_default(value):
+    """Sérialisation des scalaires numpy (labels numériques, confiances)"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """Point d'accès JSON ; le serveur porte le batcher et les réglages par défaut"""
+
+    server_version = "HierarchicalClassifier/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {
+                'status': 'ok',
+                'model': self.server.model_path,
+                'default_level': self.server.default_level,
+            })
+        elif self.path == "/metrics":
+            metrics = self.server.batcher.stats.snapshot()
+            metrics['prediction_cache'] = self.server.predictor.prediction_cache.stats()
+            self._send_json(200, metrics)
+        else:
+            self._send_json(404, {'error': f"Chemin inconnu: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {'error': f"Chemin inconnu: {self.path}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length <= 0 or length > MAX_BODY_BYTES:
+                raise ValueError("Corps de requête vide ou trop volumineux")
+            payload = json.loads(self.rfile.read(length))
+            if not isinstance(payload, dict):
+                raise ValueError("Objet JSON attendu")
+
+            single = 'text' in payload
+            texts = [payload['text']] if single else payload.get('texts')
+            if not isinstance(texts, list) or not texts:
+                raise ValueError("Champ 'text' ou 'texts' (liste non vide) attendu")
+            texts = [str(text) for text in texts]
+
+            prediction_level = payload.get('level', self.server.default_level)
+            if prediction_level not in HIERARCHY_LEVELS:
+                raise ValueError(f"Niveau inconnu: {prediction_level}")
+            joint = bool(payload.get('joint', self.server.default_joint))
+        except (ValueError, json.JSONDecodeError) as e:
+            self.server.batcher.stats.record_request(0, time.perf_counter() - start, error=True)
+            self._send_json(400, {'error': str(e)})
+            return
+
+        try:
+            predictions = self.server.batcher.submit(texts, prediction_level, joint).result()
+        except Exception as e:
+            logger.exception("Erreur de prédiction")
+            self.server.batcher.stats.record_request(len(texts), time.perf_counter() - start, error=True)
+            self._send_json(500, {'error': f"Erreur de prédiction: {e}"})
+            return
+
+        self.server.batcher.stats.record_request(len(texts), time.perf_counter() - start)
+        self._send_json(200, {'prediction': predictions[0]} if single else {'predictions': predictions})
+
+
+class InferenceServer(ThreadingHTTPServer):
+    """Serveur HTTP multithread ; file d'attente des connexions dimensionnée pour les rafales"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def swap_model(self, predictor, model_path, model_signature=None):
+        """Remplace le prédicteur servi ; les lots déjà commencés terminent avec l'ancien"""
+        self.predictor = predictor
+        self.model_path = model_path
+        self.model_signature = model_signature
+        logger.info("Modèle servi : %s", model_path)
+
+
+def model_signature(model_path):
+    """
+    Identité du contenu d'un modèle : chemin, empreinte et date de modification du
+    manifeste (fichier .pkl : date de modification). Un modèle réécrit au même
+    chemin change de signature.
+    """
+    try:
+        if is_artifact(model_path):
+            mtime = os.stat(os.path.join(model_path, MANIFEST_FILENAME)).st_mtime_ns
+            return os.path.normpath(model_path), read_manifest(model_path).get('checksum'), mtime
+        return os.path.normpath(model_path), None, os.stat(model_path).st_mtime_ns
+    except (OSError, ValueError):
+        return None
+
+
+def create_server(predictor, host="127.0.0.1", port=8000, prediction_level=None, joint=False,
+                  max_batch_size=512, max_wait_ms=10, model_path=None):
+    """Construit le serveur HTTP (non démarré) autour d'un prédicteur chargé"""
+    def predict(texts, level, use_joint):
+        return server.predictor.predict_hierarchy_batch(texts, level, joint=use_joint)
+
+    server = InferenceServer((host, port), InferenceRequestHandler)
+    server.batcher = MicroBatcher(predict, max_batch_size, max_wait_ms / 1000.0)
+    server.predictor = predictor
+    server.model_path = model_path
+    server.model_signature = model_signature(model_path) if model_path else None
+    server.default_level = prediction_level or finest_level(predictor)
+    server.default_joint = joint
+    return server
+
+
+# ----------------------------------------------------------------
+# RECHARGEMENT À CHAUD
+# ----------------------------------------------------------------
+
+class RegistryWatcher:
+    """
+    Surveille la version active d'un niveau dans le registre et la charge dès
+    qu'elle change (promotion, retour arrière, ou artefact réécrit au même chemin :
+    la signature du manifeste est comparée à celle du modèle servi). Un modèle
+    invalide est ignoré : le service continue avec le modèle courant.
+
+    Args:
+        server (InferenceServer): serveur dont le modèle est remplacé
+        registry (ModelRegistry): registre à surveiller
+        level (str): niveau de la version active suivie
+        interval (float): délai entre deux lectures de l'index (secondes)
+    """
+
+    def __init__(self, server, registry, level, interval=5.0, verify=False):
+        self.server = server
+        self.registry = registry
+        self.level = level
+        self.interval = interval
+        self.verify = verify
+        self._rejected = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="registry-watcher", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def check(self):
+        """Charge la version active si elle diffère du modèle servi ; indique si le modèle a changé"""
+        model_path = self.registry.active_path(self.level)
+        if model_path is None:
+            return False
+        # Signature lue avant le chargement : une réécriture pendant celui-ci sera vue au tour suivant
+        signature = model_signature(model_path)
+        if signature is None or signature in (self.server.model_signature, self._rejected):
+            return False
+
+        predictor = load_predictor(model_path, verify=self.verify)
+        if predictor is None:
+            logger.error("Version active %s invalide, modèle courant conservé", model_path)
+            self._rejected = signature
+            return False
+        self.server.swap_model(predictor, model_path, signature)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Erreur de surveillance du registre")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Service HTTP local de classification hiérarchique")
+    parser.add_argument("--host", default="127.0.0.1", help="adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8000, help="port d'écoute")
+    parser.add_argument("--model", help="modèle fixe (par défaut : version active du registre, "
+                                        "sinon le plus récent du niveau)")
+    parser.add_argument("--models-dir", default="saved_models", help="dossier des modèles sauvegardés")
+    parser.add_argument("--level", choices=HIERARCHY_LEVELS,
+                        help="niveau de prédiction par défaut (par défaut : le plus fin du modèle)")
+    parser.add_argument("--joint", action="store_true", help="décodage hiérarchique cohérent par défaut")
+    parser.add_argument("--max-batch-size", type=int, default=512, help="textes maximum par micro-lot")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0,
+                        help="attente maximale pour compléter un micro-lot (ms)")
+    parser.add_argument("--verify", action="store_true", help="contrôle l'empreinte de chaque fichier du modèle")
+    parser.add_argument("--allow-pickle", action="store_true",
+                        help="accepte les anciens modèles .pkl (exécutent du code : fichiers de confiance uniquement)")
+    parser.add_argument("--watch-interval", type=float, default=5.0,
+                        help="sans --model : délai de lecture du registre pour le rechargement à chaud (s, 0 : désactivé)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    model_path = args.model or find_model(args.models_dir, args.level or 'Classe', args.allow_pickle)
+    if model_path is None:
+        logger.error("Aucun modèle trouvé dans %s", args.models_dir)
+        return 1
+
+    predictor = load_predictor(model_path, args.allow_pickle, args.verify)
+    if predictor is None:
+        logger.error("Impossible de charger le modèle %s", model_path)
+        return 1
+
+    server = create_server(
+        predictor, args.host, args.port, args.level, args.joint,
+        args.max_batch_size, args.max_wait_ms, model_path
+    )
+    watcher = None
+    if args.model is None and args.watch_interval > 0:
+        watcher = RegistryWatcher(server, ModelRegistry(args.models_dir), args.level or 'Classe',
+                                  args.watch_interval, args.verify)
+
+    logger.info("Service prêt sur http://%s:%d (niveau %s)", args.host, args.port, server.default_level)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher is not None:
+            watcher.close()
+        server.server_close()
+        server.batcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,491 @@
+"""
+Format d'artefact des modèles : un dossier par modèle, sans pickle.
+
+    manifest.json       en-tête (format, version), configuration, niveaux, description
+                        typée de chaque fichier (dtype, forme, taille, empreinte) et
+                        empreinte du manifeste lui-même
+    hierarchy.json      chemins distincts de la nomenclature
+    *.npy               vocabulaires triés, IDF, labels et paramètres Naive Bayes
+
+Avant toute projection, check_artifact valide l'artefact en temps constant
+(manifeste, en-têtes .npy et tailles de fichiers, cohérence des formes et du
+nombre de labels) : un artefact incomplet, corrompu ou obsolète est refusé
+sans allocation. verify_artifact contrôle en plus l'empreinte de chaque fichier.
+
+Les tableaux numériques sont projetés en mémoire au chargement (np.load avec
+mmap_mode) : plusieurs processus (service HTTP, CLI) partagent les mêmes pages
+via le cache du système, et le chargement à froid ne lit que le manifeste, les
+vocabulaires et les labels. Le mode 'c' (copie à l'écriture) laisse les mises à
+jour incrémentales (partial_fit) modifier le modèle sans toucher aux fichiers.
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline, FeatureUnion
+from sklearn.preprocessing import LabelEncoder
+
+from feature_utils import StreamingHashingVectorizer
+from hierarchy_utils import HIERARCHY_LEVELS
+from text_utils import preprocessing_signature
+
+ARTIFACT_FORMAT = 'enhanced-hierarchical-predictor'
+ARTIFACT_VERSION = 2
+MANIFEST_FILENAME = 'manifest.json'
+HIERARCHY_FILENAME = 'hierarchy.json'
+
+# Un manifeste ne décrit que des métadonnées : au-delà, le fichier est refusé sans être lu
+MAX_MANIFEST_BYTES = 1024 * 1024
+
+# Attributs appris d'un MultinomialNB, chacun dans son propre fichier .npy
+NB_ARRAYS = ['classes', 'class_count', 'feature_count', 'class_log_prior', 'feature_log_prob']
+
+
+def is_artifact(path):
+    """Indique si un chemin est un dossier d'artefact (manifeste présent)"""
+    return os.path.isfile(os.path.join(path, MANIFEST_FILENAME))
+
+
+def read_manifest(path):
+    """Lit le manifeste d'un artefact (taille bornée)"""
+    filename = os.path.join(path, MANIFEST_FILENAME)
+    if os.path.getsize(filename) > MAX_MANIFEST_BYTES:
+        raise ValueError(f"Manifeste trop volumineux: {filename}")
+    with open(filename, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict):
+        raise ValueError(f"Manifeste invalide: {filename}")
+    return manifest
+
+
+def manifest_checksum(manifest):
+    """Empreinte du manifeste (hors champ checksum), indépendante de sa mise en forme"""
+    content = {key: value for key, value in manifest.items() if key != 'checksum'}
+    return hashlib.blake2b(json.dumps(content, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def file_checksum(filename, block_size=1024 * 1024):
+    """Empreinte blake2b du contenu d'un fichier, lu par blocs"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _slug(level):
+    return level.lower().replace(' ', '_')
+
+
+def _json_value(value):
+    """Label sérialisable en JSON (scalaires numpy convertis)"""
+    value = value.item() if isinstance(value, np.generic) else value
+    if not isinstance(value, (str, int, float, bool)):
+        raise ValueError(f"Label non pris en charge par le format d'artefact: {value!r}")
+    return value
+
+
+def _label_array(values):
+    """Tableau de labels stockable sans pickle : numérique tel quel, texte en unicode fixe"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'biuf':
+        return values
+    if all(isinstance(value, str) for value in values):
+        return values.astype(str)
+    raise ValueError("Labels de types mélangés non pris en charge par le format d'artefact")
+
+
+# ----------------------------------------------------------------
+# SAUVEGARDE
+# ----------------------------------------------------------------
+
+def _vectorizer_state(name, vectorizer, arrays):
+    """Description d'un canal du vectoriseur ; ses tableaux sont ajoutés à `arrays`"""
+    if isinstance(vectorizer, StreamingHashingVectorizer):
+        entry = {'name': name, 'type': 'hashing', 'params': vectorizer.get_params(),
+                 'n_documents': int(vectorizer.n_documents_), 'n_features': vectorizer.n_features}
+        if vectorizer.use_idf:
+            arrays[f'{name}_idf.npy'] = np.asarray(vectorizer.idf_, dtype=np.float64)
+        return entry
+
+    if isinstance(vectorizer, TfidfVectorizer):
+        params = vectorizer.get_params()
+        if any(callable(params[key]) for key in ('tokenizer', 'preprocessor', 'analyzer')):
+            raise ValueError("Vectoriseur avec fonctions personnalisées non pris en charge")
+        if params['vocabulary'] is not None:
+            raise ValueError("Vectoriseur à vocabulaire imposé non pris en charge")
+        params = {key: value for key, value in params.items() if key not in ('dtype', 'vocabulary')}
+
+        # Vocabulaire trié par numéro de colonne (ordre alphabétique après ajustement)
+        terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        arrays[f'{name}_vocabulary.npy'] = np.array(terms, dtype=str)
+        if vectorizer.use_idf:
+            arrays[f'{name}_idf.npy'] = np.asarray(vectorizer.idf_, dtype=np.float64)
+        return {'name': name, 'type': 'tfidf', 'params': params, 'n_features': len(terms)}
+
+    raise ValueError(f"Vectoriseur non pris en charge par le format d'artefact: {type(vectorizer).__name__}")
+
+
+def _vectorizer_description(vectorizer, arrays):
+    """Description du vectoriseur (un ou plusieurs canaux) ; ses tableaux sont ajoutés à `arrays`"""
+    channels = vectorizer.transformer_list if isinstance(vectorizer, FeatureUnion) else [('words', vectorizer)]
+    return {
+        'union': isinstance(vectorizer, FeatureUnion),
+        'channels': [_vectorizer_state(name, channel, arrays) for name, channel in channels],
+    }
+
+
+def save_vectorizer(vectorizer, file):
+    """
+    Écrit un vectoriseur ajusté dans un seul fichier .npz, sans pickle : description
+    JSON et tableaux (vocabulaire, IDF) du format d'artefact.
+    """
+    arrays = {}
+    description = _vectorizer_description(vectorizer, arrays)
+    content = np.frombuffer(json.dumps(description).encode('utf-8'), dtype=np.uint8)
+    np.savez(file, description=content,
+             **{filename[:-len('.npy')]: array for filename, array in arrays.items()})
+
+
+def _classifier_state(level, model, arrays):
+    """Description d'un modèle de niveau (MultinomialNB) ; ses tableaux sont ajoutés à `arrays`"""
+    classifier = model['model']
+    classifier = classifier.steps[-1][1] if isinstance(classifier, Pipeline) else classifier
+    if not isinstance(classifier, MultinomialNB):
+        raise ValueError(f"Modèle non pris en charge par le format d'artefact: {type(classifier).__name__}")
+
+    prefix = f"nb_{_slug(level)}"
+    for attribute in NB_ARRAYS:
+        arrays[f'{prefix}_{attribute}.npy'] = np.asarray(getattr(classifier, f'{attribute}_'))
+
+    class_prior = classifier.class_prior
+    return {
+        'name': model['name'],
+        # Score de validation croisée de l'entraînement (None après une mise à jour incrémentale)
+        'score': None if model['score'] is None else float(model['score']),
+        'prefix': prefix,
+        'n_classes': len(classifier.classes_),
+        'n_features': int(classifier.feature_count_.shape[1]),
+        'params': {
+            'alpha': float(classifier.alpha),
+            'fit_prior': bool(classifier.fit_prior),
+            'force_alpha': bool(classifier.force_alpha),
+            'class_prior': None if class_prior is None else [float(p) for p in class_prior],
+        },
+    }
+
+
+def _collect_paths(structure, prefix=()):
+    if not structure:
+        return [list(prefix)] if prefix else []
+    paths = []
+    for value, children in structure.items():
+        paths.extend(_collect_paths(children, prefix + (_json_value(value),)))
+    return paths
+
+
+def _file_entry(filename):
+    return {'size': os.path.getsize(filename), 'blake2b': file_checksum(filename)}
+
+
+def save_artifact(predictor, path, metadata=None):
+    """
+    Écrit le modèle d'un prédicteur dans un dossier d'artefact ; `metadata` (niveau,
+    empreinte des données, durée d'entraînement) est repris tel quel dans le manifeste.
+
+    Le dossier est d'abord écrit à côté puis mis en place par renommage : un
+    lecteur (ou une projection mémoire déjà ouverte) ne voit jamais un artefact
+    partiel.
+
+    Returns:
+        dict: manifeste écrit
+
+    Raises:
+        ValueError: vectoriseur, modèle ou labels non pris en charge par le format
+    """
+    arrays = {}
+    vectorizer_state = _vectorizer_description(predictor.vectorizer, arrays)
+
+    labels = {}
+    for level, encoder in predictor.label_encoders.items():
+        filename = f'labels_{_slug(level)}.npy'
+        arrays[filename] = _label_array(encoder.classes_)
+        labels[level] = {'file': filename, 'count': len(encoder.classes_)}
+
+    levels = {
+        level: _classifier_state(level, model, arrays)
+        for level, model in predictor.best_models.items()
+    }
+
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'version': ARTIFACT_VERSION,
+        'timestamp': datetime.now().isoformat(),
+        'feature_backend': predictor.feature_backend,
+        'use_char_ngrams': predictor.use_char_ngrams,
+        'use_smote': predictor.use_smote,
+        'training': metadata or {},
+        'vectorizer': vectorizer_state,
+        'labels': labels,
+        'levels': levels,
+        'preprocessing': preprocessing_signature(),
+        'arrays': {
+            filename: {'dtype': array.dtype.str, 'shape': list(array.shape)}
+            for filename, array in arrays.items()
+        },
+        'files': {},
+    }
+    hierarchy = {'levels': HIERARCHY_LEVELS, 'paths': _collect_paths(predictor.hierarchy_structure)}
+
+    path = os.path.normpath(path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        for filename, array in arrays.items():
+            np.save(os.path.join(tmp_path, filename), array, allow_pickle=False)
+        with open(os.path.join(tmp_path, HIERARCHY_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(hierarchy, f, ensure_ascii=False)
+        
+        # Taille et empreinte de chaque fichier, puis empreinte du manifeste
+        for filename in arrays:
+            manifest['arrays'][filename].update(_file_entry(os.path.join(tmp_path, filename)))
+        manifest['files'][HIERARCHY_FILENAME] = _file_entry(os.path.join(tmp_path, HIERARCHY_FILENAME))
+        manifest['checksum'] = manifest_checksum(manifest)
+        
+        # Le manifeste en dernier : sa présence marque un artefact complet
+        with open(os.path.join(tmp_path, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        old_path = f"{path}.{os.getpid()}.old"
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return manifest
+
+
+# ----------------------------------------------------------------
+# VALIDATION
+# ----------------------------------------------------------------
+
+def _check_array_file(filename, entry):
+    """Compare l'en-tête .npy et la taille d'un fichier à sa description (sans lire les données)"""
+    if not os.path.isfile(filename):
+        raise ValueError(f"Fichier manquant: {os.path.basename(filename)}")
+
+    with open(filename, 'rb') as f:
+        try:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                raise ValueError(f"version {version} non prise en charge")
+        except ValueError as e:
+            raise ValueError(f"En-tête .npy invalide ({os.path.basename(filename)}): {e}")
+        data_offset = f.tell()
+
+    name = os.path.basename(filename)
+    if dtype.hasobject:
+        raise ValueError(f"Tableau d'objets refusé: {name}")
+    if dtype.str != entry['dtype'] or list(shape) != entry['shape'] or fortran_order:
+        raise ValueError(f"{name}: {dtype.str} {list(shape)} au lieu de {entry['dtype']} {entry['shape']}")
+    expected_size = data_offset + int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+    if os.path.getsize(filename) != expected_size or entry.get('size') != expected_size:
+        raise ValueError(f"Taille inattendue (fichier tronqué ?): {name}")
+
+
+def _check_shapes(manifest):
+    """Cohérence des formes entre vectoriseur, labels et modèles de niveau"""
+    arrays = manifest['arrays']
+
+    def shape(filename):
+        if filename not in arrays:
+            raise ValueError(f"Tableau non décrit: {filename}")
+        return arrays[filename]['shape']
+
+    n_features = 0
+    for channel in manifest['vectorizer']['channels']:
+        size = channel['n_features']
+        if channel['type'] == 'tfidf' and shape(f"{channel['name']}_vocabulary.npy") != [size]:
+            raise ValueError(f"Vocabulaire '{channel['name']}' incohérent")
+        if channel['params'].get('use_idf') and shape(f"{channel['name']}_idf.npy") != [size]:
+            raise ValueError(f"IDF '{channel['name']}' incohérent")
+        n_features += size
+
+    for level, entry in manifest['labels'].items():
+        if shape(entry['file']) != [entry['count']]:
+            raise ValueError(f"Nombre de labels incohérent pour {level}")
+
+    for level, entry in manifest['levels'].items():
+        n_classes = entry['n_classes']
+        if level not in manifest['labels'] or n_classes > manifest['labels'][level]['count']:
+            raise ValueError(f"Labels manquants pour le niveau {level}")
+        if entry['n_features'] != n_features:
+            raise ValueError(f"{level}: {entry['n_features']} caractéristiques au lieu de {n_features}")
+        expected = {
+            'classes': [n_classes], 'class_count': [n_classes], 'class_log_prior': [n_classes],
+            'feature_count': [n_classes, n_features], 'feature_log_prob': [n_classes, n_features],
+        }
+        for attribute, expected_shape in expected.items():
+            if shape(f"{entry['prefix']}_{attribute}.npy") != expected_shape:
+                raise ValueError(f"{level}: forme incohérente pour {attribute}")
+
+
+def check_artifact(path):
+    """
+    Valide un artefact en temps constant, sans lire ni projeter les tableaux :
+    en-tête et version, empreinte du manifeste, prétraitement, en-têtes .npy et
+    tailles de fichiers, cohérence des formes et du nombre de labels.
+
+    Returns:
+        dict: manifeste validé
+
+    Raises:
+        ValueError: artefact incomplet, corrompu, obsolète ou incohérent
+    """
+    if not is_artifact(path):
+        raise ValueError(f"Pas un dossier d'artefact: {path}")
+    manifest = read_manifest(path)
+
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Format d'artefact non reconnu: {manifest.get('format')}")
+    if manifest.get('version') != ARTIFACT_VERSION:
+        raise ValueError(f"Version d'artefact {manifest.get('version')} non prise en charge "
+                         f"(attendue: {ARTIFACT_VERSION}), ré-entraînement nécessaire")
+    if manifest.get('checksum') != manifest_checksum(manifest):
+        raise ValueError("Empreinte du manifeste invalide (fichier modifié ou corrompu)")
+    if manifest.get('preprocessing') != preprocessing_signature():
+        raise ValueError("Modèle entraîné avec un autre prétraitement (dictionnaires modifiés), "
+                         "ré-entraînement nécessaire")
+
+    try:
+        for filename, entry in manifest['arrays'].items():
+            _check_array_file(os.path.join(path, filename), entry)
+        for filename, entry in manifest['files'].items():
+            if os.path.getsize(os.path.join(path, filename)) != entry['size']:
+                raise ValueError(f"Taille inattendue: {filename}")
+        _check_shapes(manifest)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Manifeste incomplet: {e}")
+    except OSError as e:
+        raise ValueError(f"Artefact illisible: {e}")
+    return manifest
+
+
+def verify_artifact(path):
+    """Validation complète : check_artifact puis empreinte de chaque fichier (lecture intégrale)"""
+    manifest = check_artifact(path)
+    entries = list(manifest['arrays'].items()) + list(manifest['files'].items())
+    for filename, entry in entries:
+        if file_checksum(os.path.join(path, filename)) != entry['blake2b']:
+            raise ValueError(f"Empreinte invalide: {filename}")
+    return manifest
+
+
+# ----------------------------------------------------------------
+# CHARGEMENT
+# ----------------------------------------------------------------
+
+def _build_vectorizer(entry, load):
+    """Reconstruit un canal ajusté du vectoriseur à partir de sa description"""
+    params = dict(entry['params'])
+    params['ngram_range'] = tuple(params['ngram_range'])
+
+    if entry['type'] == 'hashing':
+        vectorizer = StreamingHashingVectorizer(**params)
+        vectorizer.n_documents_ = entry['n_documents']
+        if vectorizer.use_idf:
+            vectorizer.idf_ = load(f"{entry['name']}_idf.npy")
+        return vectorizer
+
+    vectorizer = TfidfVectorizer(**params)
+    terms = load(f"{entry['name']}_vocabulary.npy").tolist()
+    vectorizer.vocabulary_ = dict(zip(terms, range(len(terms))))
+    if vectorizer.use_idf:
+        vectorizer.idf_ = load(f"{entry['name']}_idf.npy")
+    return vectorizer
+
+
+def _load_vectorizer(description, load):
+    channels = [(entry['name'], _build_vectorizer(entry, load)) for entry in description['channels']]
+    return FeatureUnion(channels) if description['union'] else channels[0][1]
+
+
+def load_vectorizer(file):
+    """Relit un vectoriseur écrit par save_vectorizer (aucun objet Python désérialisé)"""
+    with np.load(file, allow_pickle=False) as content:
+        description = json.loads(content['description'].tobytes().decode('utf-8'))
+        return _load_vectorizer(description, lambda filename: content[filename[:-len('.npy')]])
+
+
+def _build_classifier(entry, load):
+    """Reconstruit un MultinomialNB ajusté (dans un Pipeline, comme à l'entraînement)"""
+    params = dict(entry['params'])
+    if params['class_prior'] is not None:
+        params['class_prior'] = np.asarray(params['class_prior'])
+
+    classifier = MultinomialNB(**params)
+    for attribute in NB_ARRAYS:
+        setattr(classifier, f'{attribute}_', load(f"{entry['prefix']}_{attribute}.npy"))
+    classifier.n_features_in_ = entry['n_features']
+    return {'name': entry['name'], 'model': Pipeline([('classifier', classifier)]), 'score': entry['score']}
+
+
+def _build_structure(paths):
+    structure = {}
+    for path in paths:
+        current_level = structure
+        for value in path:
+            current_level = current_level.setdefault(value, {})
+    return structure
+
+
+def load_artifact(path, mmap_mode='c', verify=False):
+    """
+    Charge un dossier d'artefact validé ; les tableaux numériques sont projetés en mémoire.
+
+    Returns:
+        dict: mêmes clés que l'ancien fichier pickle (vectorizer, label_encoders,
+              best_models, hierarchy_structure, timestamp, ...)
+    """
+    manifest = verify_artifact(path) if verify else check_artifact(path)
+
+    def load(filename):
+        return np.load(os.path.join(path, filename), mmap_mode=mmap_mode, allow_pickle=False)
+
+    vectorizer = _load_vectorizer(manifest['vectorizer'], load)
+
+    label_encoders = {}
+    for level, entry in manifest['labels'].items():
+        classes = load(entry['file'])
+        encoder = LabelEncoder()
+        # Labels textuels en objets Python, comme après un ajustement sur un DataFrame
+        encoder.classes_ = classes.astype(object) if classes.dtype.kind == 'U' else np.array(classes)
+        label_encoders[level] = encoder
+
+    with open(os.path.join(path, HIERARCHY_FILENAME), encoding='utf-8') as f:
+        hierarchy = json.load(f)
+
+    return {
+        'vectorizer': vectorizer,
+        'label_encoders': label_encoders,
+        'hierarchy_predictors': {},
+        'best_models': {level: _build_classifier(entry, load) for level, entry in manifest['levels'].items()},
+        'hierarchy_structure': _build_structure(hierarchy['paths']),
+        'timestamp': manifest['timestamp'],
+        'use_smote': manifest['use_smote'],
+        'feature_backend': manifest['feature_backend'],
+        'use_char_ngrams': manifest['use_char_ngrams'],
+        'training_info': manifest.get('training') or None,
+    }
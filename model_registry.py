@@ -0,0 +1,359 @@
+"""
+Registre des modèles sauvegardés dans saved_models/.
+
+Un petit fichier d'index (registry.json) décrit chaque artefact : niveau, empreinte
+des données, F1 par niveau, durée d'entraînement, taille et date de création. Ces
+informations viennent des manifestes, si bien que lister les modèles ne charge ni
+ne désérialise aucun d'entre eux.
+
+Pour chaque niveau de prédiction, le registre désigne une version active (celle
+que la CLI et le service HTTP utilisent par défaut) et garde l'historique des
+versions actives précédentes, ainsi que les versions écartées par un retour
+arrière (qu'un rollforward réactive) : promotion, retour arrière et rollforward
+ne font que réécrire l'index, de façon atomique. Le nettoyage supprime les artefacts au-delà d'une
+rétention donnée, sans jamais toucher à une version active.
+
+Usage :
+    python model_registry.py list
+    python model_registry.py promote enhanced_predictor_Classe_4ae08e2f
+    python model_registry.py rollback Classe
+    python model_registry.py rollforward Classe
+    python model_registry.py gc --keep 3
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from file_utils import atomic_write_json
+from hierarchy_utils import HIERARCHY_LEVELS
+from model_artifacts import check_artifact, is_artifact, read_manifest
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+INDEX_FILENAME = 'registry.json'
+INDEX_VERSION = 1
+
+# Verrou des écritures de l'index dans le processus (threads d'entraînement, interface)
+_index_lock = threading.Lock()
+
+
+def artifact_size(path):
+    """Taille totale (octets) des fichiers d'un artefact"""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def describe_artifact(path):
+    """Entrée d'index d'un artefact, construite à partir de son seul manifeste"""
+    manifest = read_manifest(path)
+    training = manifest.get('training') or {}
+    levels = manifest.get('levels', {})
+    trained_levels = [level for level in HIERARCHY_LEVELS if level in levels]
+    return {
+        'name': os.path.basename(os.path.normpath(path)),
+        'level': training.get('prediction_level') or (trained_levels[-1] if trained_levels else None),
+        'data_hash': training.get('data_hash'),
+        # Pas de score pour une mise à jour incrémentale (non réévaluée)
+        'scores': {level: levels[level]['score'] for level in trained_levels if levels[level]['score'] is not None},
+        'update': training.get('update'),
+        'corrections': training.get('corrections'),
+        'training_seconds': training.get('seconds'),
+        'size_bytes': artifact_size(path),
+        'created': manifest.get('timestamp'),
+        'feature_backend': manifest.get('feature_backend'),
+        'use_char_ngrams': manifest.get('use_char_ngrams'),
+    }
+
+
+class ModelRegistry:
+    """
+    Index des artefacts d'un dossier de modèles, avec version active par niveau.
+
+    Args:
+        models_directory (str): dossier des artefacts et de l'index
+    """
+
+    def __init__(self, models_directory="saved_models"):
+        self.models_directory = models_directory
+        self.index_filename = os.path.join(models_directory, INDEX_FILENAME)
+
+    # ----------------------------------------------------------------
+    # INDEX
+    # ----------------------------------------------------------------
+
+    def _empty_index(self):
+        return {'version': INDEX_VERSION, 'models': {}, 'active': {}, 'history': {}, 'undone': {}}
+
+    def read_index(self):
+        """Contenu de l'index (vide s'il n'existe pas encore ou s'il est illisible)"""
+        try:
+            with open(self.index_filename, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return self._empty_index()
+        if not isinstance(index, dict) or index.get('version') != INDEX_VERSION:
+            return self._empty_index()
+        index.setdefault('undone', {})
+        return index
+
+    @contextmanager
+    def _update(self):
+        """Lecture, modification puis réécriture de l'index sous verrou (threads et processus)"""
+        os.makedirs(self.models_directory, exist_ok=True)
+        with _index_lock, open(f"{self.index_filename}.lock", 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index = self.read_index()
+            yield index
+            atomic_write_json(self.index_filename, index)
+
+    def get_path(self, name):
+        return os.path.join(self.models_directory, name)
+
+    # ----------------------------------------------------------------
+    # ENREGISTREMENT ET CONSULTATION
+    # ----------------------------------------------------------------
+
+    def register(self, path, promote=False):
+        """
+        Ajoute (ou met à jour) un artefact dans l'index, et le rend actif si demandé.
+
+        Returns:
+            dict: entrée d'index de l'artefact
+        """
+        entry = describe_artifact(path)
+        with self._update() as index:
+            index['models'][entry['name']] = entry
+            if promote:
+                self._promote(index, entry['name'])
+        return entry
+
+    def sync(self):
+        """
+        Aligne l'index sur le dossier : ajoute les artefacts non indexés, retire les
+        entrées dont le dossier a disparu.
+
+        Returns:
+            tuple: (noms ajoutés, noms retirés)
+        """
+        on_disk = {
+            entry.name for entry in os.scandir(self.models_directory)
+            if entry.is_dir() and is_artifact(entry.path)
+        } if os.path.isdir(self.models_directory) else set()
+
+        with self._update() as index:
+            added = sorted(on_disk - set(index['models']))
+            removed = sorted(set(index['models']) - on_disk)
+            for name in added:
+                index['models'][name] = describe_artifact(self.get_path(name))
+            for name in removed:
+                self._forget(index, name)
+        return added, removed
+
+    def list_models(self, level=None):
+        """Entrées de l'index (les plus récentes d'abord), avec l'indicateur 'active'"""
+        index = self.read_index()
+        active = set(index['active'].values())
+        models = [
+            dict(entry, active=entry['name'] in active)
+            for entry in index['models'].values()
+            if level is None or entry['level'] == level
+        ]
+        return sorted(models, key=lambda entry: entry.get('created') or '', reverse=True)
+
+    def active_model(self, level):
+        """Nom de la version active d'un niveau (None si aucune)"""
+        return self.read_index()['active'].get(level)
+
+    def active_path(self, level):
+        """Dossier de la version active d'un niveau (None si aucune ou disparue)"""
+        name = self.active_model(level)
+        return self.get_path(name) if name and is_artifact(self.get_path(name)) else None
+
+    # ----------------------------------------------------------------
+    # PROMOTION, RETOUR ARRIÈRE, NETTOYAGE
+    # ----------------------------------------------------------------
+
+    def _promote(self, index, name):
+        level = index['models'][name]['level']
+        previous = index['active'].get(level)
+        if previous == name:
+            return
+        if previous:
+            index['history'].setdefault(level, []).append(previous)
+        index['active'][level] = name
+        # Une nouvelle promotion rend caducs les retours arrière précédents
+        index['undone'].pop(level, None)
+
+    def _forget(self, index, name):
+        entry = index['models'].pop(name, None)
+        for stacks in (index['history'], index['undone']):
+            for level, names in stacks.items():
+                stacks[level] = [previous for previous in names if previous != name]
+        if entry is not None and index['active'].get(entry['level']) == name:
+            del index['active'][entry['level']]
+
+    def promote(self, name):
+        """
+        Rend active une version indexée, après validation de son artefact (temps constant).
+
+        Raises:
+            ValueError: version inconnue ou artefact invalide
+        """
+        check_artifact(self.get_path(name))
+        with self._update() as index:
+            if name not in index['models']:
+                raise ValueError(f"Version inconnue du registre: {name}")
+            self._promote(index, name)
+        return name
+
+    def _switch(self, index, level, source, target):
+        """
+        Réactive la dernière version disponible de la pile `source` d'un niveau ; la
+        version remplacée est empilée dans `target` (les versions disparues sont ignorées).
+        """
+        names = index[source].get(level, [])
+        while names:
+            name = names.pop()
+            if name in index['models'] and is_artifact(self.get_path(name)):
+                current = index['active'].get(level)
+                if current:
+                    index[target].setdefault(level, []).append(current)
+                index['active'][level] = name
+                return name
+        return None
+
+    def rollback(self, level):
+        """
+        Réactive la version active précédente d'un niveau ; la version remplacée reste
+        disponible pour rollforward.
+
+        Raises:
+            ValueError: aucune version précédente disponible
+        """
+        with self._update() as index:
+            name = self._switch(index, level, 'history', 'undone')
+        if name is None:
+            raise ValueError(f"Aucune version précédente pour le niveau {level}")
+        return name
+
+    def rollforward(self, level):
+        """
+        Annule le dernier retour arrière d'un niveau (réactive la version qu'il a remplacée).
+
+        Raises:
+            ValueError: aucun retour arrière à annuler
+        """
+        with self._update() as index:
+            name = self._switch(index, level, 'undone', 'history')
+        if name is None:
+            raise ValueError(f"Aucun retour arrière à annuler pour le niveau {level}")
+        return name
+
+    def gc(self, keep=5, max_age_days=None, dry_run=False):
+        """
+        Supprime les artefacts hors rétention : au-delà des `keep` plus récents de
+        chaque niveau, ou plus anciens que max_age_days. Les versions actives sont
+        toujours conservées.
+
+        Returns:
+            list: noms des versions supprimées (ou à supprimer avec dry_run)
+        """
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat() if max_age_days is not None else None
+
+        with self._update() as index:
+            active = set(index['active'].values())
+            by_level = {}
+            for entry in index['models'].values():
+                by_level.setdefault(entry['level'], []).append(entry)
+
+            expired = []
+            for entries in by_level.values():
+                entries.sort(key=lambda entry: entry.get('created') or '', reverse=True)
+                for rank, entry in enumerate(entries):
+                    too_old = cutoff is not None and (entry.get('created') or '') < cutoff
+                    if entry['name'] not in active and (rank >= keep or too_old):
+                        expired.append(entry['name'])
+
+            if not dry_run:
+                for name in expired:
+                    self._forget(index, name)
+                    shutil.rmtree(self.get_path(name), ignore_errors=True)
+        return sorted(expired)
+
+
+# ----------------------------------------------------------------
+# LIGNE DE COMMANDE
+# ----------------------------------------------------------------
+
+def format_entry(entry):
+    scores = ", ".join(f"{level} {score:.3f}" for level, score in entry['scores'].items())
+    seconds = entry.get('training_seconds')
+    update = f"  +{entry['corrections']} correction(s)" if entry.get('update') == 'incremental' else ""
+    return (f"{'*' if entry['active'] else ' '} {entry['name']}  {entry['level']}  "
+            f"{(entry.get('created') or '')[:19]}  {entry['size_bytes'] / 1e6:.1f} Mo  "
+            f"{f'{seconds:.1f} s' if seconds is not None else '-'}  F1: {scores or '-'}{update}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Registre des modèles sauvegardés")
+    parser.add_argument("--models-dir", default="saved_models", help="dossier des modèles sauvegardés")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="liste les versions (* : active)")
+    list_parser.add_argument("--level", choices=HIERARCHY_LEVELS, help="niveau de prédiction")
+
+    promote_parser = commands.add_parser("promote", help="rend une version active")
+    promote_parser.add_argument("name", help="nom de la version (dossier d'artefact)")
+
+    rollback_parser = commands.add_parser("rollback", help="réactive la version précédente d'un niveau")
+    rollback_parser.add_argument("level", choices=HIERARCHY_LEVELS, help="niveau de prédiction")
+
+    rollforward_parser = commands.add_parser("rollforward", help="annule le dernier retour arrière d'un niveau")
+    rollforward_parser.add_argument("level", choices=HIERARCHY_LEVELS, help="niveau de prédiction")
+
+    gc_parser = commands.add_parser("gc", help="supprime les versions hors rétention")
+    gc_parser.add_argument("--keep", type=int, default=5, help="versions conservées par niveau")
+    gc_parser.add_argument("--max-age-days", type=float, help="âge maximal des versions non actives")
+    gc_parser.add_argument("--dry-run", action="store_true", help="affiche sans supprimer")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    registry = ModelRegistry(args.models_dir)
+
+    try:
+        if args.command == "list":
+            added, removed = registry.sync()
+            if added or removed:
+                print(f"Index mis à jour : {len(added)} ajout(s), {len(removed)} retrait(s)")
+            for entry in registry.list_models(args.level):
+                print(format_entry(entry))
+        elif args.command == "promote":
+            registry.sync()
+            print(f"Version active : {registry.promote(args.name)}")
+        elif args.command == "rollback":
+            print(f"Version active : {registry.rollback(args.level)}")
+        elif args.command == "rollforward":
+            print(f"Version active : {registry.rollforward(args.level)}")
+        elif args.command == "gc":
+            registry.sync()
+            removed = registry.gc(args.keep, args.max_age_days, args.dry_run)
+            verb = "à supprimer" if args.dry_run else "supprimée(s)"
+            print(f"{len(removed)} version(s) {verb}" + "".join(f"\n  {name}" for name in removed))
+    except (ValueError, OSError) as e:
+        print(f"Erreur: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1006 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+import pickle
+import hashlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline, FeatureUnion
+from sklearn.preprocessing import LabelEncoder
+
+from text_utils import normalize_text, normalize_texts, preprocessing_signature
+from file_utils import atomic_write, atomic_write_json
+from feature_utils import StreamingHashingVectorizer
+from hierarchy_utils import HierarchyIndex
+from model_artifacts import (
+    check_artifact, is_artifact, load_artifact, load_vectorizer, save_artifact, save_vectorizer
+)
+from model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+# Colonnes couvertes par l'empreinte des données, et version de son calcul. La langue,
+# quand elle est fournie, en fait partie : le nettoyage de chaque réponse en dépend.
+DATA_HASH_COLUMNS = ['reponse', 'Classe', 'Grand poste', 'Section', 'Groupe']
+DATA_HASH_OPTIONAL_COLUMNS = ['langage']
+DATA_HASH_VERSION = 'blake2b-8-langage'
+
+# Correspondance entre les niveaux de message du prédicteur et ceux du module logging
+MESSAGE_LEVELS = {
+    'info': logging.INFO,
+    'success': logging.INFO,
+    'report': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+
+class PredictionCache:
+    """
+    Cache LRU borné des prédictions, indexé par (version du modèle, niveau, décodage
+    conjoint, sélections, texte prétraité). Les compteurs mesurent la part des lignes
+    servies sans passer par le modèle (doublons d'un bloc compris).
+    """
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self.rows_seen = 0
+        self.rows_scored = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # Une copie du prédicteur (corrections) repart d'un cache vide
+        return PredictionCache(self.max_entries)
+
+    def get_many(self, keys):
+        """Valeurs associées aux clés (None pour les absentes)"""
+        with self._lock:
+            values = []
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                values.append(value)
+            return values
+
+    def put_many(self, keys, values):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, rows, scored):
+        """Comptabilise un bloc : lignes reçues et lignes réellement évaluées par le modèle"""
+        with self._lock:
+            self.rows_seen += rows
+            self.rows_scored += scored
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Compteurs cumulés et taux de réponses servies sans recalcul"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'rows_seen': self.rows_seen,
+                'rows_scored': self.rows_scored,
+                'hit_rate': 1 - self.rows_scored / self.rows_seen if self.rows_seen else 0.0,
+            }
+
+
+class EnhancedHierarchicalPredictor:
+    """
+    Moteur de classification hiérarchique (Grand poste > Section > Groupe > Classe),
+    sans dépendance à l'interface : les messages et la progression passent par le
+    logger du module et, si elles sont définies, par les fonctions on_message(niveau,
+    texte) et on_progress(fraction, texte). Une fraction None signale la fin d'une tâche.
+    """
+
+    # Moteurs de caractéristiques disponibles (libellé affiché -> identifiant)
+    FEATURE_BACKENDS = {
+        'TF-IDF (vocabulaire)': 'tfidf',
+        'Hachage (mémoire bornée)': 'hashing'
+    }
+    
+    def __init__(self, feature_backend='tfidf', use_char_ngrams=False):
+        self.feature_backend = feature_backend
+        self.use_char_ngrams = use_char_ngrams
+        self.vectorizer = self.make_vectorizer()
+        
+        # Modèle unique pour CPU - MultinomialNB seulement
+        self.base_models = {
+            'Naive Bayes': MultinomialNB()#,
+#            'Logistic Regression': LogisticRegression(max_iter=1000, solver='lbfgs', multi_class='auto')
+        }
+        
+        # Grille de paramètres simplifiée
+        self.param_grids = {
+            'Naive Bayes': {'alpha': [0.1, 0.5, 1.0]}#,
+#                 'Logistic Regression': {'C': [0.1, 1.0, 5.0], 'class_weight': [None, 'balanced']
+#            }
+        }
+        
+        # Structures de suivi
+        self.label_encoders = {}
+        self.hierarchy_predictors = {}
+        self.best_models = {}
+        self.hierarchy_structure = {}
+        self._hierarchy_index = None
+        self._path_index = {}
+        self._path_constraints = {}
+        self.prediction_cache = PredictionCache()
+        self.model_version = uuid.uuid4().hex[:12]
+        self.models_directory = "saved_models"
+        self.cache_directory = os.path.join(self.models_directory, "cache")
+        self.use_smote = True
+        
+        # Parallélisme de l'entraînement : cœurs répartis entre niveaux et plis de validation
+        self.n_jobs = os.cpu_count() or 1
+        
+        # Retours vers l'appelant (interface, CLI) : aucun par défaut, le logger suffit
+        self.on_message = None
+        self.on_progress = None
+        self.last_report = None
+        
+        # Dernier entraînement (niveau, empreinte des données, durée), repris dans le manifeste
+        self.training_info = None
+        
+        if not os.path.exists(self.models_directory):
+            os.makedirs(self.models_directory)
+    
+    # ----------------------------------------------------------------
+    # UTILS
+    # ----------------------------------------------------------------
+
+    def notify(self, level, message):
+        """Transmet un message ('info', 'success', 'warning', 'error', 'report')"""
+        logger.log(MESSAGE_LEVELS.get(level, logging.INFO), message)
+        if self.on_message is not None:
+            self.on_message(level, message)
+    
+    def report_progress(self, fraction, message=None):
+        """Transmet l'avancement d'une tâche (fraction entre 0 et 1, None à la fin)"""
+        if message:
+            logger.info(message)
+        if self.on_progress is not None:
+            self.on_progress(fraction, message)
+    
+    def invalidate_predictions(self):
+        """Oublie les chemins et prédictions mémorisés : à appeler dès que modèles ou hiérarchie changent"""
+        self._hierarchy_index = None
+        self._path_index = {}
+        self._path_constraints = {}
+        self.model_version = uuid.uuid4().hex[:12]
+        self.prediction_cache.clear()
+    
+    def get_data_hash(self, df, source_path=None):
+        """
+        Empreinte des données : les hachages de lignes de pandas (uint64) sont condensés
+        par blake2b directement depuis leur tampon mémoire, sans copie ni conversion en
+        texte, en une clé de 16 caractères hexadécimaux.
+        
+        Avec source_path, l'empreinte est mémorisée avec la date de modification et la
+        taille du fichier : un fichier inchangé n'est pas haché de nouveau.
+        """
+        path = os.path.abspath(source_path) if source_path else None
+        signature = self.get_file_signature(path) if path else None
+        hashes = self.load_file_hashes() if signature else {}
+        entry = hashes.get(path)
+        if entry and entry.get('signature') == signature:
+            return entry['hash']
+        
+        columns = DATA_HASH_COLUMNS + [col for col in DATA_HASH_OPTIONAL_COLUMNS if col in df.columns]
+        row_hashes = pd.util.hash_pandas_object(df[columns], index=True).to_numpy()
+        data_hash = hashlib.blake2b(memoryview(np.ascontiguousarray(row_hashes)), digest_size=8).hexdigest()
+        
+        if signature:
+            hashes[path] = {'signature': signature, 'hash': data_hash}
+            self._write_cache(atomic_write_json, self.get_file_hashes_filename(), hashes, 1)
+        return data_hash
+    
+    def get_file_signature(self, path):
+        """Version d'un fichier : date de modification, taille et méthode d'empreinte"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'method': DATA_HASH_VERSION}
+    
+    def get_file_hashes_filename(self):
+        return os.path.join(self.cache_directory, "data_hashes.json")
+    
+    def load_file_hashes(self):
+        """Empreintes mémorisées par version de fichier ({} si absentes ou illisibles)"""
+        try:
+            with open(self.get_file_hashes_filename(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def get_model_prefix(self, data_hash, prediction_level):
+        """Préfixe des versions d'un modèle : niveau, empreinte des données et options de caractéristiques"""
+        suffix = "" if self.feature_backend == 'tfidf' else f"_{self.feature_backend}"
+        if self.use_char_ngrams:
+            suffix += "_char"
+        return f"enhanced_predictor_{prediction_level}_{data_hash}{suffix}"
+    
+    def get_model_filename(self, data_hash, prediction_level):
+        """
+        Génère le chemin (dossier d'artefact) d'une nouvelle version du modèle : un
+        ré-entraînement sur les mêmes données crée une version distincte, que le
+        registre peut ensuite désigner ou écarter (retour arrière).
+        """
+        version = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+        return os.path.join(self.models_directory, f"{self.get_model_prefix(data_hash, prediction_level)}_{version}")
+    
+    def find_saved_model(self, data_hash, prediction_level):
+        """
+        Dernière version sauvegardée pour ces données et ces options (None si aucune) :
+        la version active du registre si elle correspond, sinon la plus récente.
+        """
+        pattern = re.compile(re.escape(self.get_model_prefix(data_hash, prediction_level)) + r'(_\d{14}-[0-9a-f]{6})?')
+        if not os.path.isdir(self.models_directory):
+            return None
+        candidates = [
+            entry.path for entry in os.scandir(self.models_directory)
+            if pattern.fullmatch(entry.name) and is_artifact(entry.path)
+        ]
+        if not candidates:
+            return None
+        active_path = ModelRegistry(self.models_directory).active_path(prediction_level)
+        if active_path is not None and os.path.normpath(active_path) in map(os.path.normpath, candidates):
+            return active_path
+        return max(candidates, key=os.path.getmtime)
+    
+    def resolve_model_path(self, filename, allow_pickle=False):
+        """Artefact existant pour un chemin de modèle, ou ancien fichier pickle si autorisé (None si aucun)"""
+        if is_artifact(filename):
+            return filename
+        if allow_pickle:
+            for candidate in (filename, f"{filename}.pkl"):
+                if os.path.isfile(candidate) and candidate.endswith('.pkl'):
+                    return candidate
+        return None
+    
+    def make_vectorizer(self):
+        """Crée un vectoriseur non ajusté pour le moteur de caractéristiques choisi"""
+        if self.feature_backend == 'hashing':
+            # Sans vocabulaire : mémoire d'ajustement constante, ajustement par blocs
+            word_vectorizer = StreamingHashingVectorizer(n_features=2 ** 16, ngram_range=(1, 3), use_idf=True)
+        else:
+            word_vectorizer = TfidfVectorizer(
+                max_features=10000,
+                ngram_range=(1, 3),
+                lowercase=True,
+                analyzer='word',
+                min_df=1,
+                max_df=0.95
+            )
+        
+        if not self.use_char_ngrams:
+            return word_vectorizer
+        
+        # Canal n-grammes de caractères (dans les limites des mots) : robuste aux fautes de
+        # frappe ("coifure" / "coiffure"), empilé avec les mots en une seule transformation
+        if self.feature_backend == 'hashing':
+            char_vectorizer = StreamingHashingVectorizer(
+                n_features=2 ** 15, ngram_range=(3, 5), analyzer='char_wb', use_idf=True
+            )
+        else:
+            char_vectorizer = TfidfVectorizer(
+                max_features=20000,
+                ngram_range=(3, 5),
+                lowercase=True,
+                analyzer='char_wb',
+                min_df=2,
+                max_df=0.95,
+                sublinear_tf=True
+            )
+        return FeatureUnion([('words', word_vectorizer), ('chars', char_vectorizer)])
+    
+    def get_cache_filename(self, kind, key):
+        """Génère le nom de fichier d'une entrée du cache disque (textes nettoyés, matrices)"""
+        return os.path.join(self.cache_directory, f"{kind}_{key}_{preprocessing_signature()}.npz")
+    
+    def load_cleaned_texts(self, data_hash):
+        """Recharge la colonne reponse_clean depuis le cache disque (None si absente)"""
+        filename = self.get_cache_filename("reponse_clean", data_hash)
+        if not os.path.exists(filename):
+            return None
+        try:
+            with np.load(filename) as cached:
+                count = int(cached['count'])
+                content = cached['content'].tobytes().decode('utf-8')
+            return content.split('\n') if count else []
+        except Exception:
+            return None
+    
+    def save_cleaned_texts(self, data_hash, texts):
+        """Enregistre la colonne reponse_clean (UTF-8 contigu, une ligne par texte)"""
+        content = np.frombuffer('\n'.join(texts).encode('utf-8'), dtype=np.uint8)
+        self._write_cache(
+            atomic_write, self.get_cache_filename("reponse_clean", data_hash),
+            lambda f: np.savez(f, count=len(texts), content=content)
+        )
+    
+    def _write_cache(self, writer, filename, *args):
+        """Écrit un fichier de cache avec une écriture atomique de file_utils (atomic_write, atomic_write_json)"""
+        try:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            writer(filename, *args)
+        except Exception:
+            # Le cache n'est qu'une optimisation : une erreur d'écriture n'est pas bloquante
+            pass
+    
+    def get_feature_key(self, data_hash):
+        """Clé du cache de la matrice : données et configuration du vectoriseur"""
+        params = repr(sorted(self.vectorizer.get_params().items()))
+        return f"{data_hash}_{hashlib.md5(params.encode()).hexdigest()[:8]}"
+    
+    def fit_features(self, df, data_hash=None):
+        """Ajuste le vectoriseur sur le corpus, ou le recharge avec sa matrice depuis le cache disque"""
+        data_hash = data_hash or self.get_data_hash(df)
+        feature_key = self.get_feature_key(data_hash)
+        matrix_filename = self.get_cache_filename("features", feature_key)
+        # Vectoriseur au format des artefacts : le cache disque n'est jamais désérialisé par pickle
+        vectorizer_filename = self.get_cache_filename("vectorizer", feature_key)
+        
+        if os.path.exists(matrix_filename) and os.path.exists(vectorizer_filename):
+            try:
+                X = sparse.load_npz(matrix_filename)
+                vectorizer = load_vectorizer(vectorizer_filename)
+                if X.shape[0] == len(df):
+                    self.vectorizer = vectorizer
+                    return X
+            except Exception:
+                pass
+        
+        X = self.vectorizer.fit_transform(df['reponse_clean'])
+        self._write_cache(atomic_write, matrix_filename, lambda f: sparse.save_npz(f, X))
+        self._write_cache(atomic_write, vectorizer_filename, lambda f: save_vectorizer(self.vectorizer, f))
+        return X
+    
+    def save_models(self, filename, data_hash=None, promote=True):
+        """
+        Sauvegarde tous les modèles et encodeurs optimisés (dossier d'artefact), puis
+        les inscrit au registre du dossier.
+        
+        Args:
+            filename (str): dossier d'artefact
+            data_hash (str, optional): empreinte des données du modèle (par défaut celle du dernier entraînement)
+            promote (bool): rend cette version active pour son niveau
+        """
+        metadata = dict(self.training_info or {})
+        if data_hash:
+            metadata['data_hash'] = data_hash
+        
+        try:
+            save_artifact(self, filename, metadata)
+        except ValueError as e:
+            # Modèle hors du format d'artefact : il reste utilisable pour la session
+            self.notify('warning', f"Sauvegarde impossible: {e}")
+            return False
+        self.training_info = metadata
+        
+        try:
+            ModelRegistry(os.path.dirname(filename) or '.').register(filename, promote=promote)
+        except (OSError, ValueError) as e:
+            self.notify('warning', f"Modèle sauvegardé mais non inscrit au registre: {e}")
+        
+        self.notify('success', f"Meilleurs modèles sauvegardés: {filename}")
+        return True
+    
+    def save_pickle(self, filename):
+        """Sauvegarde l'ensemble du prédicteur dans un fichier pickle (ancien format, lu avec allow_pickle)"""
+        model_data = {
+            'vectorizer': self.vectorizer,
+            'label_encoders': self.label_encoders,
+            'hierarchy_predictors': self.hierarchy_predictors,
+            'best_models': self.best_models,
+            'hierarchy_structure': self.hierarchy_structure,
+            'timestamp': datetime.now().isoformat(),
+            'use_smote': self.use_smote,
+            'feature_backend': self.feature_backend,
+            'use_char_ngrams': self.use_char_ngrams,
+            'training_info': self.training_info
+        }
+        
+        with open(filename, 'wb') as f:
+            pickle.dump(model_data, f)
+    
+    def load_models(self, filename, allow_pickle=False, verify=False):
+        """
+        Charge les modèles sauvegardés depuis un dossier d'artefact validé.
+        
+        Les anciens fichiers pickle exécutent du code au chargement : ils ne sont
+        lus que si allow_pickle est vrai (fichiers de confiance uniquement).
+        
+        Args:
+            filename (str): dossier d'artefact (ou fichier .pkl)
+            allow_pickle (bool): accepte l'ancien format pickle
+            verify (bool): contrôle l'empreinte de chaque fichier de l'artefact
+        """
+        try:
+            filename = self.resolve_model_path(filename, allow_pickle) or filename
+            if is_artifact(filename):
+                model_data = load_artifact(filename, verify=verify)
+            elif allow_pickle and os.path.isfile(filename):
+                with open(filename, 'rb') as f:
+                    model_data = pickle.load(f)
+            elif filename.endswith('.pkl'):
+                raise ValueError(f"Ancien format pickle refusé (chargement non sûr): {filename}")
+            else:
+                raise ValueError(f"Aucun artefact de modèle: {filename}")
+            
+            self.vectorizer = model_data['vectorizer']
+            self.label_encoders = model_data['label_encoders']
+            self.hierarchy_predictors = model_data.get('hierarchy_predictors', {})
+            self.best_models = model_data.get('best_models', {})
+            self.hierarchy_structure = model_data.get('hierarchy_structure', {})
+            self.invalidate_predictions()
+            self.use_smote = model_data.get('use_smote', True)
+            self.feature_backend = model_data.get('feature_backend', 'tfidf')
+            self.use_char_ngrams = model_data.get('use_char_ngrams', False)
+            self.training_info = model_data.get('training_info')
+            
+            timestamp = model_data.get('timestamp', 'Inconnu')
+            self.notify('success', f"Modèles optimisés chargés (sauvegardés le: {timestamp[:19]})")
+            return True
+        except Exception as e:
+            self.notify('warning', f"Impossible de charger les modèles: {e}")
+            return False
+    
+    def models_exist(self, filename):
+        """Vérifie si un artefact valide existe (contrôle en temps constant, sans chargement)"""
+        if not is_artifact(filename):
+            return False
+        try:
+            check_artifact(filename)
+            return True
+        except ValueError as e:
+            self.notify('warning', f"Modèle sauvegardé ignoré: {e}")
+            return False
+    
+    # ----------------------------------------------------------------
+    # STRUCTURE HIÉRARCHIQUE
+    # ----------------------------------------------------------------
+
+    def build_hierarchy_structure(self, df):
+        """Construit la structure hiérarchique complète"""
+        self.hierarchy_structure = {}
+        self.invalidate_predictions()
+        return self.add_hierarchy_paths(df)
+    
+    def add_hierarchy_paths(self, df):
+        """Ajoute à la structure existante les chemins distincts d'un DataFrame (données, corrections)"""
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        
+        for path in df[hierarchy_levels].drop_duplicates().itertuples(index=False):
+            current_level = self.hierarchy_structure
+            for value in path:
+                current_level = current_level.setdefault(value, {})
+        
+        self.invalidate_predictions()
+        return self.hierarchy_structure
+    
+    def get_hierarchy_index(self):
+        """Index compact de la hiérarchie (construit à la demande, réinitialisé à chaque modification)"""
+        if self._hierarchy_index is None:
+            self._hierarchy_index = HierarchyIndex.from_structure(self.hierarchy_structure)
+        return self._hierarchy_index
+    
+    def get_filtered_options(self, level, parent_selections):
+        """Obtient les options filtrées pour un niveau donné basé sur les sélections parentes"""
+        return self.get_hierarchy_index().options(level, parent_selections)
+    
+    def get_unique_prediction_path(self, selections):
+        """Vérifie si le chemin sélectionné mène à une classe unique"""
+        index = self.get_hierarchy_index()
+        node = -1
+        
+        for level in index.levels:
+            if not selections.get(level):
+                break
+            node = index.node(level, selections[level], node)
+            if node is None:
+                return False, None
+            
+            # Classe sélectionnée : chemin complet
+            if level == 'Classe':
+                return True, selections[level]
+            # Une seule option au niveau suivant
+            children = index.children(level, node)
+            if len(children) == 1:
+                return False, index.labels[index.depth(level) + 1][children[0]]
+        
+        return False, None
+    
+    # ----------------------------------------------------------------
+    # PRÉTRAITEMENT
+    # ----------------------------------------------------------------
+    def preprocess_text(self, text, language='auto'):
+        """Preprocessing du texte adapté à la langue"""
+        return normalize_text(text, language)
+    
+    def preprocess_texts(self, texts, languages=None):
+        """Preprocessing vectorisé d'une colonne de textes"""
+        return normalize_texts(texts, languages)
+    
+    def check_class_imbalance(self, y, threshold=0.1):
+        """Vérifie le déséquilibre des classes"""
+        class_counts = Counter(y)
+        total_samples = len(y)
+        min_class_ratio = min(class_counts.values()) / total_samples
+        
+        if min_class_ratio < threshold:
+            return True
+        return False
+    
+    def prepare_data(self, df, prediction_level='Classe', data_hash=None):
+        """Préparation des données (data_hash : empreinte déjà calculée de df, le cas échéant)"""
+        data_hash = data_hash or self.get_data_hash(df)
+        cleaned_texts = self.load_cleaned_texts(data_hash)
+        
+        if cleaned_texts is None or len(cleaned_texts) != len(df):
+            cleaned_texts = self.preprocess_texts(
+                df['reponse'], df['langage'] if 'langage' in df.columns else None
+            )
+            self.save_cleaned_texts(data_hash, cleaned_texts)
+        
+        df['reponse_clean'] = cleaned_texts
+        
+        # Construire la structure hiérarchique
+        self.build_hierarchy_structure(df)
+        
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
+        
+        for level in target_levels:
+            if level not in self.label_encoders:
+                le = LabelEncoder()
+                df[f'{level}_encoded'] = le.fit_transform(df[level])
+                self.label_encoders[level] = le
+        
+        return df
+    
+    # ----------------------------------------------------------------
+    # ENTRAÎNEMENT AVEC PRISE EN COMPTE DES CORRECTIONS
+    # ----------------------------------------------------------------
+
+    def train_hierarchical_models(self, df, prediction_level='Classe', data_hash=None):
+        """Compare Naive Bayes et Logistic Regression à chaque niveau hiérarchique"""
+        # Imports propres à l'entraînement : l'inférence seule n'en a pas besoin
+        from sklearn.metrics import classification_report
+
+        start = time.perf_counter()
+        data_hash = data_hash or self.get_data_hash(df)
+
+        # 🔁 Recalcul complet du TF-IDF (intègre les corrections), sauf si le cache disque
+        # contient déjà la matrice de ces mêmes données
+        self.vectorizer = self.make_vectorizer()
+
+        X = self.fit_features(df, data_hash)
+        self.invalidate_predictions()
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
+
+        trainable_levels = []
+        for level in target_levels:
+            encoded_col = f'{level}_encoded'
+            if encoded_col not in df.columns:
+                continue
+
+            if df[encoded_col].nunique() < 2:
+                self.notify('warning', f"Pas assez de classes pour {level}")
+                continue
+            trainable_levels.append(level)
+
+        if not trainable_levels:
+            return
+
+        # Les niveaux sont indépendants étant donné X : un thread par niveau, et les
+        # cœurs restants parallélisent les plis de la recherche par grille
+        n_jobs = max(1, int(self.n_jobs))
+        level_workers = min(len(trainable_levels), n_jobs)
+        grid_n_jobs = max(1, n_jobs // level_workers)
+
+        self.report_progress(0.0, f"🔄 Entraînement des niveaux: {', '.join(trainable_levels)} ({n_jobs} cœur(s))")
+
+        evaluations = {}
+        with ThreadPoolExecutor(max_workers=level_workers) as executor:
+            futures = {
+                executor.submit(self.train_level, X, df[f'{level}_encoded'], grid_n_jobs): level
+                for level in trainable_levels
+            }
+
+            # Les retours restent dans le thread appelant (l'interface n'est pas thread-safe)
+            for done, future in enumerate(as_completed(futures), start=1):
+                level = futures[future]
+                self.best_models[level], evaluations[level] = future.result()
+                best_name, best_score = self.best_models[level]['name'], self.best_models[level]['score']
+
+                self.report_progress(done / len(trainable_levels))
+                self.notify('success', f"✅ {level}: {best_name} (F1={best_score:.3f})")
+
+        self.report_progress(None)
+
+        # Initialisation des encodeurs de labels pour chaque niveau
+#        label_encoders = {}
+        
+#        for level in target_levels:
+#            if level not in label_encoders:
+#                le = LabelEncoder()
+#                df[f'{level}_encoded'] = le.fit_transform(df[level])
+#                label_encoders[level] = le  # Conserver l'encodeur pour une utilisation ultérieure
+
+        # Calculer et afficher le rapport de classification (niveau le plus fin)
+        X_test, y_test = evaluations[trainable_levels[-1]]
+        y_pred = self.best_models[trainable_levels[-1]]['model'].predict(X_test)
+        report = classification_report(y_test, y_pred)#, target_names=le.classes_)
+        self.last_report = report
+        self.training_info = {
+            'prediction_level': prediction_level,
+            'data_hash': data_hash,
+            'seconds': time.perf_counter() - start,
+        }
+        self.notify('report', report)
+        return report
+
+    def train_level(self, X, y, grid_n_jobs=1):
+        """Sélectionne le meilleur modèle d'un niveau ; retourne le modèle et le jeu de test"""
+        from sklearn.model_selection import train_test_split, GridSearchCV, StratifiedKFold
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y
+        )
+
+#        if predictor.use_smote:
+#            smote = SMOTE(random_state=42)
+#            X_train, y_train = smote.fit_resample(X_train, y_train)
+
+        best_model, best_name, best_score = None, None, 0.0
+        for model_name, model in self.base_models.items():
+            param_grid = {f"classifier__{k}": v for k, v in self.param_grids[model_name].items()}
+            pipeline = Pipeline([('classifier', clone(model))])
+            grid = GridSearchCV(
+                pipeline, param_grid, cv=StratifiedKFold(3, shuffle=True, random_state=42),
+                scoring='f1_weighted', n_jobs=grid_n_jobs
+            )
+            grid.fit(X_train, y_train)
+            if grid.best_score_ > best_score:
+                best_model, best_name, best_score = grid.best_estimator_, model_name, grid.best_score_
+
+        best = {
+            'name': best_name,
+            'model': best_model,
+            'score': best_score
+        }
+        return best, (X_test, y_test)
+
+    # ----------------------------------------------------------------
+    # MISE À JOUR INCRÉMENTALE
+    # ----------------------------------------------------------------
+
+    def extend_label_encoder(self, level, labels):
+        """Ajoute les labels inconnus à l'encodeur d'un niveau ; retourne l'ancien -> nouveau code"""
+        old_classes = self.label_encoders[level].classes_
+        new_classes = np.union1d(old_classes, np.asarray(labels, dtype=old_classes.dtype))
+        
+        if len(new_classes) == len(old_classes):
+            return None
+        
+        new_le = LabelEncoder()
+        new_le.fit(new_classes)
+        self.label_encoders[level] = new_le
+        return np.searchsorted(new_classes, old_classes)
+
+    def grow_classifier(self, classifier, remap, n_classes):
+        """Agrandit un MultinomialNB entraîné pour de nouvelles classes (comptes à zéro)"""
+        old_codes = remap[classifier.classes_]
+        
+        class_count = np.zeros(n_classes)
+        class_count[old_codes] = classifier.class_count_
+        feature_count = np.zeros((n_classes, classifier.feature_count_.shape[1]))
+        feature_count[old_codes] = classifier.feature_count_
+        
+        classifier.classes_ = np.arange(n_classes)
+        classifier.class_count_ = class_count
+        classifier.feature_count_ = feature_count
+
+    def partial_fit_corrections(self, correction_df, prediction_level='Classe'):
+        """
+        Intègre des corrections sans ré-entraînement : le vocabulaire est conservé et
+        les comptes par classe de chaque niveau sont mis à jour en place (partial_fit).
+        Les labels jamais vus agrandissent les encodeurs et les modèles.
+        
+        Les scores F1 de l'entraînement ne décrivent plus les modèles mis à jour : ils
+        sont effacés, et training_info décrit la mise à jour elle-même.
+        
+        Returns:
+            bool: False si un niveau ne supporte pas la mise à jour incrémentale
+        """
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
+        
+        classifiers = {}
+        for level in target_levels:
+            if level not in self.best_models or level not in self.label_encoders:
+                return False
+            classifier = self.best_models[level]['model']
+            classifier = classifier.steps[-1][1] if isinstance(classifier, Pipeline) else classifier
+            if not hasattr(classifier, 'partial_fit') or not hasattr(classifier, 'feature_count_'):
+                return False
+            classifiers[level] = classifier
+        
+        start = time.perf_counter()
+        X = self.vectorizer.transform(correction_df['reponse_clean'])
+        
+        for level in target_levels:
+            labels = correction_df[level].values
+            remap = self.extend_label_encoder(level, labels)
+            if remap is not None:
+                self.grow_classifier(classifiers[level], remap, len(self.label_encoders[level].classes_))
+            classifiers[level].partial_fit(X, self.label_encoders[level].transform(labels))
+            self.best_models[level]['score'] = None
+        
+        self.add_hierarchy_paths(correction_df)
+        self.training_info = {
+            'prediction_level': prediction_level,
+            'update': 'incremental',
+            'base_data_hash': (self.training_info or {}).get('data_hash'),
+            'corrections': len(correction_df),
+            'seconds': time.perf_counter() - start,
+        }
+        return True
+
+    # ----------------------------------------------------------------
+    # PRÉDICTION
+    # ----------------------------------------------------------------
+
+    def predict_level(self, level, X, allowed=None):
+        """Labels et confiances d'un niveau à partir d'un seul calcul de probabilités"""
+        model = self.best_models[level]['model']
+        classes = self.label_encoders[level].classes_
+        
+        if not hasattr(model, 'predict_proba'):
+            return classes[model.predict(X)], np.ones(X.shape[0])
+        
+        # Une seule évaluation du modèle : le label est l'argmax des probabilités
+        proba = model.predict_proba(X)
+        if allowed is not None:
+            proba = np.where(allowed[model.classes_], proba, 0.0)
+        best = proba.argmax(axis=1)
+        return classes[model.classes_[best]], proba[np.arange(len(best)), best]
+
+    def level_log_proba(self, level, X):
+        """Log-probabilités d'un niveau alignées sur les classes de l'encodeur"""
+        model = self.best_models[level]['model']
+        log_proba = np.full((X.shape[0], len(self.label_encoders[level].classes_)), -np.inf)
+        
+        if hasattr(model, 'predict_log_proba'):
+            log_proba[:, model.classes_] = model.predict_log_proba(X)
+        else:
+            log_proba[np.arange(X.shape[0]), model.predict(X)] = 0.0
+        return log_proba
+
+    def get_path_index(self, prediction_level='Classe'):
+        """Matrice (chemins x niveaux) des codes de tous les chemins valides de la hiérarchie"""
+        if prediction_level in self._path_index:
+            return self._path_index[prediction_level]
+        
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
+        paths = self.get_hierarchy_index().path_labels(prediction_level)
+        
+        # Encodage des chemins ; ceux contenant un label inconnu des encodeurs sont ignorés
+        codes = [
+            {label: code for code, label in enumerate(self.label_encoders[level].classes_)}
+            if level in self.label_encoders else {}
+            for level in target_levels
+        ]
+        encoded = np.array(
+            [[codes[i].get(value, -1) for value in paths[:, i]] for i in range(len(target_levels))],
+            dtype=np.intp
+        ).T.reshape(-1, len(target_levels))
+        
+        path_index = encoded[(encoded >= 0).all(axis=1)]
+        self._path_index[prediction_level] = path_index
+        return path_index
+
+    def get_path_constraint(self, selections, prediction_level='Classe'):
+        """Chemins autorisés et masques de classes par niveau pour des sélections parentes (mis en cache)"""
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
+        
+        key = (prediction_level,) + tuple(selections.get(level) or None for level in target_levels)
+        if key in self._path_constraints:
+            return self._path_constraints[key]
+        
+        paths = self.get_path_index(prediction_level)
+        mask = np.ones(len(paths), dtype=bool)
+        for i, level in enumerate(target_levels):
+            value = selections.get(level)
+            if value:
+                codes = np.flatnonzero(self.label_encoders[level].classes_ == value)
+                mask &= (paths[:, i] == codes[0]) if len(codes) else False
+        
+        # Aucune sélection, ou sélection absente de la hiérarchie : pas de contrainte
+        constraint = None
+        if key[1:] != (None,) * len(target_levels) and mask.any():
+            allowed_paths = paths[mask]
+            level_masks = {}
+            for i, level in enumerate(target_levels):
+                level_mask = np.zeros(len(self.label_encoders[level].classes_), dtype=bool)
+                level_mask[allowed_paths[:, i]] = True
+                level_masks[level] = level_mask
+            constraint = {'paths': allowed_paths, 'level_masks': level_masks}
+        
+        self._path_constraints[key] = constraint
+        return constraint
+
+    def decode_hierarchy(self, X, prediction_level='Classe', constraint=None):
+        """Décodage conjoint : meilleur chemin valide (somme des log-probabilités des niveaux)"""
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
+        paths = constraint['paths'] if constraint else self.get_path_index(prediction_level)
+        
+        scores = np.zeros((X.shape[0], len(paths)))
+        level_log_probas = {}
+        for i, level in enumerate(target_levels):
+            if level in self.best_models:
+                level_log_probas[level] = self.level_log_proba(level, X)
+                scores += level_log_probas[level][:, paths[:, i]]
+        
+        best = paths[scores.argmax(axis=1)]
+        rows = np.arange(X.shape[0])
+        
+        labels, confidences = {}, {}
+        for i, level in enumerate(target_levels):
+            labels[level] = self.label_encoders[level].classes_[best[:, i]]
+            if level in level_log_probas:
+                confidences[level] = np.exp(level_log_probas[level][rows, best[:, i]])
+            else:
+                confidences[level] = np.zeros(X.shape[0])
+        
+        return labels, confidences
+
+    def predict_matrix(self, X, prediction_level='Classe', joint=False, selections=None):
+        """Labels et confiances par niveau pour une matrice de caractéristiques"""
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
+        
+        # Prédiction guidée : seuls les descendants des sélections parentes sont autorisés
+        constraint = self.get_path_constraint(selections, prediction_level) if selections else None
+        
+        if joint and self.best_models and len(self.get_path_index(prediction_level)) > 0:
+            return self.decode_hierarchy(X, prediction_level, constraint)
+        
+        labels, confidences = {}, {}
+        for level in target_levels:
+            if level not in self.best_models:
+                labels[level] = np.full(X.shape[0], "Non disponible", dtype=object)
+                confidences[level] = np.zeros(X.shape[0])
+                continue
+            
+            allowed = constraint['level_masks'][level] if constraint else None
+            labels[level], confidences[level] = self.predict_level(level, X, allowed)
+        
+        return labels, confidences
+
+    def predict_hierarchy(self, text, prediction_level='Classe', joint=False, selections=None):
+        text_clean = self.preprocess_text(text)
+        X = self.vectorizer.transform([text_clean])
+        labels, confidences = self.predict_matrix(X, prediction_level, joint, selections)
+        
+        predictions = {level: values[0] for level, values in labels.items()}
+        probabilities = {level: float(values[0]) for level, values in confidences.items()}
+        return predictions, probabilities
+
+    def predict_cleaned(self, cleaned_texts, prediction_level='Classe', joint=False, selections=None,
+                        return_stats=False):
+        """
+        Labels et confiances par niveau pour des textes déjà prétraités.
+
+        Chaque texte distinct n'est évalué qu'une fois, et seulement s'il est absent
+        du cache de prédictions ; les résultats sont ensuite redistribués aux
+        positions d'origine.
+
+        Avec return_stats, retourne aussi les compteurs de cet appel ('rows_seen',
+        'rows_scored') : le cache étant partagé (sessions, threads du service), ses
+        compteurs cumulés ne permettent pas d'isoler un appel.
+        """
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
+        n_levels = len(target_levels)
+
+        # Textes distincts et position de chaque ligne parmi eux
+        positions = {}
+        inverse = np.fromiter(
+            (positions.setdefault(text, len(positions)) for text in cleaned_texts),
+            dtype=np.intp, count=len(cleaned_texts)
+        )
+        unique_texts = list(positions)
+
+        selection_key = tuple(sorted(selections.items())) if selections else None
+        context = (self.model_version, prediction_level, joint, selection_key)
+        keys = [context + (text,) for text in unique_texts]
+        cached = self.prediction_cache.get_many(keys)
+
+        # Une ligne par texte distinct : les labels puis les confiances de chaque niveau
+        values = np.empty((len(unique_texts), 2 * n_levels), dtype=object)
+        missing = [i for i, value in enumerate(cached) if value is None]
+        hits = [i for i, value in enumerate(cached) if value is not None]
+        if hits:
+            values[hits] = [cached[i] for i in hits]
+
+        if missing:
+            X = self.vectorizer.transform([unique_texts[i] for i in missing])
+            labels, confidences = self.predict_matrix(X, prediction_level, joint, selections)
+            for j, level in enumerate(target_levels):
+                values[missing, j] = labels[level]
+                values[missing, n_levels + j] = confidences[level]
+            self.prediction_cache.put_many([keys[i] for i in missing], map(tuple, values[missing]))
+
+        self.prediction_cache.record(len(cleaned_texts), len(missing))
+
+        values = values[inverse]
+        labels = {level: values[:, j] for j, level in enumerate(target_levels)}
+        confidences = {level: values[:, n_levels + j].astype(float) for j, level in enumerate(target_levels)}
+        if return_stats:
+            return labels, confidences, {'rows_seen': len(cleaned_texts), 'rows_scored': len(missing)}
+        return labels, confidences
+
+    def predict_hierarchy_batch(self, texts, prediction_level='Classe', chunk_size=5000, joint=False,
+                                selections=None, return_stats=False):
+        """
+        Prédiction vectorisée d'un ensemble de textes (doublons et textes déjà vus évalués une seule fois).
+
+        Avec return_stats, retourne (résultats, compteurs de l'appel) : voir predict_cleaned.
+        """
+        texts = [str(text) for text in texts]
+        hierarchy_levels = ['Grand poste', 'Section', 'Groupe', 'Classe']
+        target_levels = hierarchy_levels[:hierarchy_levels.index(prediction_level) + 1]
+
+        labels = {level: [] for level in target_levels}
+        confidences = {level: [] for level in target_levels}
+        stats = {'rows_seen': 0, 'rows_scored': 0}
+
+        for start in range(0, len(texts), chunk_size):
+            chunk = texts[start:start + chunk_size]
+            chunk_labels, chunk_confidences, chunk_stats = self.predict_cleaned(
+                self.preprocess_texts(chunk), prediction_level, joint, selections, return_stats=True
+            )
+            for key, value in chunk_stats.items():
+                stats[key] += value
+
+            for level in target_levels:
+                labels[level].append(chunk_labels[level])
+                confidences[level].append(chunk_confidences[level])
+
+        results = {}
+        for level in target_levels:
+            results[level] = np.concatenate(labels[level]) if labels[level] else np.array([], dtype=object)
+            results[f'Confiance_{level}'] = np.concatenate(confidences[level]) if confidences[level] else np.array([])
+
+        if return_stats:
+            return pd.DataFrame(results), stats
+        return pd.DataFrame(results)
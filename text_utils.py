@@ -0,0 +1,142 @@
+import hashlib
+import re
+from functools import lru_cache
+
+from dico import dictionnaire_fr, dictionnaire_en
+
+
+# Motifs précompilés une fois pour toutes
+_NON_WORD_PATTERN = re.compile(r'[^\w\s\àâäéèêëïîôöùûüÿñç]')
+
+
+def resolve_language(language):
+    """Ramène la valeur de la colonne `langage` à 'fr', 'en' ou 'auto'"""
+    if not isinstance(language, str) or not language.strip():
+        return 'auto'
+    language = language.strip().lower()
+    if language.startswith(('en', 'ang')):
+        return 'en'
+    if language.startswith('fr'):
+        return 'fr'
+    return 'auto'
+
+
+def _corrections_for(language):
+    """Dictionnaire de corrections à appliquer pour une langue"""
+    if language == 'fr':
+        return dictionnaire_fr
+    if language == 'en':
+        return dictionnaire_en
+    # Langue inconnue : les deux dictionnaires, le français étant prioritaire
+    return {**dictionnaire_en, **dictionnaire_fr}
+
+
+def _trie_pattern(keys):
+    """Motif regex factorisé par préfixes communs (arbre de caractères) reconnaissant les clés"""
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node, after_word_char):
+        alternatives = [
+            re.escape(char) + build(child, bool(re.match(r'\w', char)))
+            for char, child in sorted(node.items()) if char
+        ]
+        # Fin de clé en dernier : la correspondance la plus longue est préférée.
+        # Une clé finissant par une lettre ne doit pas couper un mot.
+        if '' in node:
+            alternatives.append(r'(?!\w)' if after_word_char else '')
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return '(?:' + '|'.join(alternatives) + ')'
+
+    return build(trie, False)
+
+
+@lru_cache(maxsize=None)
+def get_spelling_corrector(language='auto'):
+    """
+    Compile le dictionnaire de corrections d'une langue en un seul motif.
+
+    Le motif reconnaît en une passe les clés contenant de la ponctuation ou des
+    espaces (arbre de préfixes, la plus longue d'abord) et tout autre mot
+    entier ; chaque correspondance est ensuite résolue par une recherche dans
+    le dictionnaire. Les mots étant consommés en entier, le moteur ne tente
+    jamais de correspondance au milieu d'un mot : "mais" ne réécrit pas
+    "maison". Le correcteur est construit une seule fois par processus et
+    par langue.
+
+    Returns:
+        callable: fonction texte -> texte corrigé (texte déjà en minuscules)
+    """
+    corrections = _corrections_for(resolve_language(language))
+
+    special_keys = [key for key in corrections if not re.fullmatch(r'\w+', key)]
+    alternatives = [_trie_pattern(special_keys)] if special_keys else []
+    alternatives.append(r'\w+')
+
+    matcher = re.compile('|'.join(alternatives))
+
+    def replace(match):
+        token = match.group(0)
+        return corrections.get(token, token)
+
+    def correct(text):
+        return matcher.sub(replace, text)
+
+    return correct
+
+
+def correct_spelling(text, language='auto'):
+    """Applique le dictionnaire de corrections de la langue au texte"""
+    return get_spelling_corrector(resolve_language(language))(text)
+
+
+@lru_cache(maxsize=None)
+def preprocessing_signature():
+    """Empreinte du prétraitement (motifs et dictionnaires) pour invalider les caches disque"""
+    content = repr((
+        _NON_WORD_PATTERN.pattern,
+        sorted(dictionnaire_fr.items()),
+        sorted(dictionnaire_en.items()),
+    ))
+    return hashlib.md5(content.encode('utf-8')).hexdigest()[:8]
+
+
+def normalize_text(text, language='auto'):
+    """Minuscules, corrections orthographiques, ponctuation et espaces normalisés"""
+    text = correct_spelling(str(text).lower(), language)
+    return ' '.join(_NON_WORD_PATTERN.sub(' ', text).split())
+
+
+def normalize_texts(texts, languages=None):
+    """
+    Version colonne de normalize_text : une compréhension de liste sur des
+    motifs précompilés, la langue n'étant résolue qu'une fois par valeur distincte.
+
+    Args:
+        texts (iterable): textes bruts
+        languages (iterable, optional): valeurs de la colonne `langage`
+
+    Returns:
+        list: textes normalisés, dans le même ordre
+    """
+    texts = [str(text) for text in texts]
+    if languages is None:
+        languages = ['auto'] * len(texts)
+    else:
+        # Les valeurs manquantes (None/NaN) sont ramenées à 'auto'
+        languages = [language if isinstance(language, str) else 'auto' for language in languages]
+
+    correctors = {
+        language: get_spelling_corrector(resolve_language(language))
+        for language in set(languages)
+    }
+    non_word_sub = _NON_WORD_PATTERN.sub
+    return [
+        ' '.join(non_word_sub(' ', correctors[language](text.lower())).split())
+        for text, language in zip(texts, languages)
+    ]
@@ -0,0 +1,323 @@
+"""
+Entraînement des modèles en arrière-plan.
+
+Chaque demande d'entraînement devient un job identifié, exécuté hors du script
+Streamlit par un pool de threads : un rerun de l'interface ne l'interrompt pas,
+et le modèle déjà publié reste servi jusqu'à la fin du job. La sauvegarde d'un
+modèle mis à jour par corrections, déjà publié, est aussi un job de ce pool.
+L'état de chaque job (statut, avancement, message, artefact produit) est conservé
+en mémoire et enregistré dans un fichier JSON, lisible par un autre processus.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from file_utils import atomic_write_json
+from predictor_core import EnhancedHierarchicalPredictor
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ('pending', 'running')
+
+# Part de l'avancement attribuée à chaque étape (préparation, entraînement, sauvegarde)
+PREPARE_SHARE = 0.1
+TRAIN_SHARE = 0.85
+
+# Identifiant de ce processus : un pid peut être réattribué (pid 1 à chaque redémarrage d'un conteneur)
+PROCESS_ID = uuid.uuid4().hex
+
+
+def _process_start_time(pid):
+    """Date de démarrage d'un processus (tops d'horloge depuis le démarrage du système, Linux ; None sinon)"""
+    try:
+        with open(f"/proc/{pid}/stat", encoding='utf-8') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Champs après le nom de la commande (entre parenthèses, espaces possibles) ; starttime est le 22e
+    fields = stat[stat.rfind(')') + 2:].split()
+    return int(fields[19]) if len(fields) > 19 else None
+
+
+def _process_alive(pid):
+    """Indique si un processus existe encore (faux si pid inconnu)"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _job_owner_alive(job):
+    """
+    Indique si le processus qui a lancé un job tourne encore : même identifiant de
+    processus que le nôtre, ou pid vivant dont la date de démarrage n'a pas changé.
+    """
+    if job.get('process_id') == PROCESS_ID:
+        return True
+    pid = job.get('pid')
+    if pid == os.getpid() or not _process_alive(pid):
+        return False
+    started = job.get('process_start')
+    return started is None or _process_start_time(pid) == started
+
+
+class TrainingJobRunner:
+    """
+    Exécute les entraînements en arrière-plan (un à la fois par défaut, l'entraînement
+    étant lui-même parallélisé) et suit leur état.
+
+    Une clé identifie le modèle demandé (niveau, données, options) : tant qu'un
+    entraînement est en attente ou en cours pour une clé, une nouvelle demande le
+    retrouve au lieu d'en lancer un second.
+
+    Args:
+        jobs_directory (str): dossier des fichiers d'état des jobs
+        max_workers (int): entraînements simultanés
+        max_jobs (int): jobs terminés conservés (en mémoire et sur disque)
+    """
+
+    def __init__(self, jobs_directory=os.path.join("saved_models", "jobs"), max_workers=1, max_jobs=50):
+        self.jobs_directory = jobs_directory
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="training")
+
+        os.makedirs(jobs_directory, exist_ok=True)
+        self._recover()
+
+    # ----------------------------------------------------------------
+    # ÉTAT
+    # ----------------------------------------------------------------
+
+    def get_job_filename(self, job_id):
+        return os.path.join(self.jobs_directory, f"{job_id}.json")
+
+    def _persist(self, job):
+        """Enregistre l'état d'un job (écriture atomique, sûre entre threads)"""
+        try:
+            atomic_write_json(self.get_job_filename(job['job_id']), job)
+        except OSError as e:
+            logger.warning("État du job %s non enregistré: %s", job['job_id'], e)
+
+    def _recover(self):
+        """
+        Marque comme interrompus les jobs laissés actifs par un processus arrêté, et
+        supprime les fichiers des jobs terminés les plus anciens au-delà de max_jobs.
+        """
+        jobs = []
+        for entry in os.scandir(self.jobs_directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+        for job in jobs:
+            if job.get('status') in ACTIVE_STATES and not _job_owner_alive(job):
+                job.update(status='interrupted', finished=datetime.now().isoformat(),
+                           message="Processus arrêté avant la fin de l'entraînement")
+                self._persist(job)
+
+        finished = sorted((job for job in jobs if job.get('status') not in ACTIVE_STATES),
+                          key=lambda job: job.get('created') or '')
+        for job in finished[:max(0, len(finished) - self.max_jobs)]:
+            try:
+                os.remove(self.get_job_filename(job['job_id']))
+            except (OSError, KeyError):
+                pass
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes)
+            snapshot = dict(job)
+        self._persist(snapshot)
+
+    def _prune(self):
+        """Oublie les jobs terminés les plus anciens au-delà de max_jobs (appelé sous verrou)"""
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] not in ACTIVE_STATES]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+            self._keys.pop(job_id, None)
+            try:
+                os.remove(self.get_job_filename(job_id))
+            except OSError:
+                pass
+
+    def get(self, job_id):
+        """État d'un job (copie), lu sur disque s'il n'est pas suivi par ce processus (None si inconnu)"""
+        with self._lock:
+            if job_id in self._jobs:
+                return dict(self._jobs[job_id])
+        try:
+            with open(self.get_job_filename(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def latest(self, key, kind='train'):
+        """Dernier job d'un type ('train' ou 'save') lancé pour une clé (None si aucun)"""
+        with self._lock:
+            for job_id in reversed(self._jobs):
+                if self._keys.get(job_id) == key and self._jobs[job_id]['kind'] == kind:
+                    return dict(self._jobs[job_id])
+        return None
+
+    # ----------------------------------------------------------------
+    # EXÉCUTION
+    # ----------------------------------------------------------------
+
+    def submit(self, key, df, prediction_level, data_hash, model_path, predictor_options=None, on_success=None):
+        """
+        Lance l'entraînement d'un nouveau prédicteur, ou retrouve le job actif de la même clé.
+
+        Args:
+            key (tuple): identifiant du modèle demandé
+            df (DataFrame): données d'entraînement (copiées, jamais modifiées)
+            prediction_level (str): niveau de prédiction maximum
+            data_hash (str): empreinte des données
+            model_path (str): dossier d'artefact à écrire
+            predictor_options (dict, optional): feature_backend, use_char_ngrams, use_smote, n_jobs
+            on_success (callable, optional): appelé avec (prédicteur, données préparées) avant
+                que le job ne passe à l'état 'succeeded'
+
+        Returns:
+            str: identifiant du job
+        """
+        with self._lock:
+            for job_id in reversed(self._jobs):
+                job = self._jobs[job_id]
+                if self._keys.get(job_id) == key and job['kind'] == 'train' and job['status'] in ACTIVE_STATES:
+                    return job_id
+            job = self._create(key, 'train', prediction_level, data_hash, model_path)
+        self._persist(job)
+        job_id = job['job_id']
+
+        self._executor.submit(
+            self._run, job_id, df.copy(), prediction_level, data_hash, model_path,
+            dict(predictor_options or {}), on_success
+        )
+        return job_id
+
+    def submit_save(self, key, predictor, df_prepared, prediction_level):
+        """
+        Sauvegarde en arrière-plan un prédicteur déjà publié (mise à jour par corrections) :
+        empreinte des données mises à jour, puis nouvelle version du modèle.
+
+        Le prédicteur et les données ne doivent plus être modifiés (entrée publiée, en
+        lecture seule). Chaque demande crée son propre job.
+
+        Args:
+            key (tuple): identifiant du modèle
+            predictor (EnhancedHierarchicalPredictor): prédicteur à sauvegarder
+            df_prepared (DataFrame): données préparées, corrections incluses
+            prediction_level (str): niveau de prédiction maximum
+
+        Returns:
+            str: identifiant du job
+        """
+        with self._lock:
+            job = self._create(key, 'save', prediction_level, None, None)
+        self._persist(job)
+        job_id = job['job_id']
+
+        self._executor.submit(self._run_save, job_id, predictor, df_prepared, prediction_level)
+        return job_id
+
+    def _create(self, key, kind, prediction_level, data_hash, model_path):
+        """Ajoute un nouveau job en attente (appelé sous verrou) et en renvoie une copie"""
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'pending',
+            'progress': 0.0,
+            'message': "En attente",
+            'prediction_level': prediction_level,
+            'data_hash': data_hash,
+            'model_path': model_path,
+            'artifact_path': None,
+            'error': None,
+            'pid': os.getpid(),
+            'process_id': PROCESS_ID,
+            'process_start': _process_start_time(os.getpid()),
+            'created': datetime.now().isoformat(),
+            'started': None,
+            'finished': None,
+        }
+        self._jobs[job_id] = job
+        self._keys[job_id] = key
+        self._prune()
+        return dict(job)
+
+    def _run(self, job_id, df, prediction_level, data_hash, model_path, predictor_options, on_success):
+        self._update(job_id, status='running', started=datetime.now().isoformat(),
+                     message="Préparation des données")
+        try:
+            predictor = EnhancedHierarchicalPredictor(
+                feature_backend=predictor_options.get('feature_backend', 'tfidf'),
+                use_char_ngrams=predictor_options.get('use_char_ngrams', False)
+            )
+            predictor.use_smote = predictor_options.get('use_smote', predictor.use_smote)
+            predictor.n_jobs = predictor_options.get('n_jobs', predictor.n_jobs)
+
+            # Retours du prédicteur vers l'état du job (jamais vers l'interface)
+            def on_message(level, message):
+                if level != 'report':
+                    self._update(job_id, message=message)
+
+            def on_progress(fraction, message=None):
+                changes = {'message': message} if message else {}
+                if fraction is not None:
+                    changes['progress'] = PREPARE_SHARE + TRAIN_SHARE * fraction
+                self._update(job_id, **changes)
+
+            predictor.on_message = on_message
+            predictor.on_progress = on_progress
+
+            df_prepared = predictor.prepare_data(df, prediction_level, data_hash)
+            self._update(job_id, progress=PREPARE_SHARE)
+            predictor.train_hierarchical_models(df_prepared, prediction_level, data_hash)
+
+            self._update(job_id, progress=PREPARE_SHARE + TRAIN_SHARE, message="Sauvegarde du modèle")
+            artifact_path = model_path if predictor.save_models(model_path, data_hash) else None
+
+            if on_success is not None:
+                on_success(predictor, df_prepared)
+            self._update(job_id, status='succeeded', progress=1.0, artifact_path=artifact_path,
+                         finished=datetime.now().isoformat(), message="Entraînement terminé")
+        except Exception as e:
+            logger.exception("Échec du job d'entraînement %s", job_id)
+            self._update(job_id, status='failed', error=str(e), finished=datetime.now().isoformat(),
+                         message="Échec de l'entraînement")
+
+    def _run_save(self, job_id, predictor, df_prepared, prediction_level):
+        self._update(job_id, status='running', started=datetime.now().isoformat(),
+                     message="Empreinte des données")
+        try:
+            data_hash = predictor.get_data_hash(df_prepared)
+            model_path = predictor.get_model_filename(data_hash, prediction_level)
+            self._update(job_id, progress=PREPARE_SHARE, data_hash=data_hash, model_path=model_path,
+                         message="Sauvegarde du modèle")
+            if not predictor.save_models(model_path, data_hash):
+                raise ValueError("modèle hors du format d'artefact")
+            self._update(job_id, status='succeeded', progress=1.0, artifact_path=model_path,
+                         finished=datetime.now().isoformat(), message="Sauvegarde terminée")
+        except Exception as e:
+            logger.exception("Échec du job de sauvegarde %s", job_id)
+            self._update(job_id, status='failed', error=str(e), finished=datetime.now().isoformat(),
+                         message="Échec de la sauvegarde")